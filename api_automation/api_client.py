@@ -0,0 +1,363 @@
+"""API client for the DemoQA book store backend.
+
+All API steps should go through ``ApiClient`` instead of calling ``requests``
+directly, so they share one pooled ``requests.Session`` per worker, reuse
+keep-alive connections across scenarios, retry idempotent calls and cache
+auth tokens.
+
+Typical use from ``environment.py``::
+
+    from behave.fixture import use_fixture
+    from api_client import api_client, attach_step_timings
+
+    def before_all(context):
+        use_fixture(api_client, context)
+
+    def after_step(context, step):
+        attach_step_timings(context, step)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from behave.fixture import fixture
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "https://demoqa.com"
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_RETRIES = 3
+TOKEN_FALLBACK_TTL = 300
+ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F-]{16,}|\d+)(?=/|$)")
+
+log = logging.getLogger("api_client")
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+# -- Callables notified with each RequestTiming (e.g. by the load mode).
+request_listeners = []
+
+# -- Sockets opened by the current thread; see CountingAdapter.
+_connections = threading.local()
+
+
+def _new_connections():
+    return getattr(_connections, "count", 0)
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _connections.count = _new_connections() + 1
+        return super(CountingHTTPConnectionPool, self)._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _connections.count = _new_connections() + 1
+        return super(CountingHTTPSConnectionPool, self)._new_conn()
+
+
+class CountingAdapter(HTTPAdapter):
+    """``HTTPAdapter`` whose pools count new sockets per thread.
+
+    urllib3 opens a connection in the thread that needs it, so comparing the
+    thread-local count before and after a request tells whether this request
+    opened a socket, even if other threads share the session.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CountingAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+def endpoint_name(method, endpoint):
+    """``DELETE /Account/v1/User/<uuid>`` -> ``DELETE /Account/v1/User/{id}``."""
+    return "%s %s" % (method, ID_SEGMENT.sub("/{id}", endpoint))
+
+
+def build_session(pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=True,
+                  retries=DEFAULT_RETRIES, backoff_factor=0.3):
+    """Create a ``requests.Session`` with a sized connection pool.
+
+    Retries only apply to idempotent methods (urllib3's default
+    ``allowed_methods``), so a POST that creates a user is never sent twice.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = CountingAdapter(pool_connections=pool_maxsize,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept": "application/json"})
+    return session
+
+
+def get_session(**session_options):
+    """Return the pooled session of the current worker process.
+
+    The first call in a process builds the session with ``session_options``;
+    later calls reuse it, so connections stay alive across scenarios.
+    """
+    pid = os.getpid()
+    with _sessions_lock:
+        session = _sessions.get(pid)
+        if session is None:
+            session = _sessions[pid] = build_session(**session_options)
+        return session
+
+
+def close_sessions():
+    """Close every pooled session of this process (call from ``after_all``)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def clear_token_cache():
+    with _tokens_lock:
+        _tokens.clear()
+
+
+def _parse_expires(value):
+    """Convert the API's ``expires`` timestamp to epoch seconds."""
+    if not value:
+        return time.time() + TOKEN_FALLBACK_TTL
+    try:
+        expires = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return time.time() + TOKEN_FALLBACK_TTL
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp()
+
+
+class RequestTiming(object):
+    """Timing of one HTTP call.
+
+    ``ttfb`` is the time until the response headers were parsed (taken from
+    ``response.elapsed``); ``total`` also covers reading the body. ``requests``
+    does not expose DNS and connect time separately, so ``new_connection``
+    tells whether the call had to open a socket instead of reusing one.
+
+    A call that got no response (connection error, timeout) has ``status``
+    and ``ttfb`` set to None and the exception's class name in ``error``.
+    """
+
+    def __init__(self, method, endpoint, status, ttfb, total, new_connection,
+                 error=None):
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self.ttfb = ttfb
+        self.total = total
+        self.new_connection = new_connection
+        self.error = error
+
+    def __repr__(self):
+        if self.status is None:
+            outcome = "%s total=%.3fs" % (self.error, self.total)
+        else:
+            outcome = "%s ttfb=%.3fs total=%.3fs" % (self.status, self.ttfb,
+                                                      self.total)
+        return "<RequestTiming %s %s %s%s>" % (
+            self.method, self.endpoint, outcome,
+            " new-conn" if self.new_connection else "")
+
+    @property
+    def name(self):
+        return endpoint_name(self.method, self.endpoint)
+
+    def to_dict(self):
+        data = {"method": self.method, "endpoint": self.endpoint,
+                "status": self.status, "ttfb": self.ttfb, "total": self.total,
+                "new_connection": self.new_connection}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class ApiClient(object):
+    """Thin wrapper around the book store endpoints."""
+
+    def __init__(self, base_url=None, session=None, timeout=DEFAULT_TIMEOUT):
+        base_url = base_url or os.environ.get("BOOKSTORE_BASE_URL",
+                                              DEFAULT_BASE_URL)
+        self.base_url = base_url.rstrip("/")
+        self.session = session if session is not None else get_session()
+        self.timeout = timeout
+        self.timings = []
+
+    @property
+    def pool_maxsize(self):
+        """Connections the session keeps per host (None if unknown)."""
+        adapter = self.session.get_adapter(self.base_url)
+        return getattr(adapter, "_pool_maxsize", None)
+
+    # -- Low level ------------------------------------------------------------
+    def request(self, method, endpoint, token=None, **kwargs):
+        """Send a request and record its timing in ``self.timings``.
+
+        Failed calls (``requests.RequestException``) are recorded too, with
+        ``status`` None, before the exception is raised again.
+        """
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = "Bearer %s" % token
+        kwargs.setdefault("timeout", self.timeout)
+
+        connections_before = _new_connections()
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + endpoint,
+                                            headers=headers, **kwargs)
+            _ = response.content
+        except requests.RequestException as error:
+            self._record(RequestTiming(
+                method, endpoint, None, None, time.perf_counter() - start,
+                _new_connections() > connections_before,
+                error=type(error).__name__))
+            raise
+        total = time.perf_counter() - start
+
+        self._record(RequestTiming(method, endpoint, response.status_code,
+                                   response.elapsed.total_seconds(), total,
+                                   _new_connections() > connections_before))
+        return response
+
+    def _record(self, timing):
+        self.timings.append(timing)
+        log.debug("%r", timing)
+        for listener in request_listeners:
+            listener(timing)
+
+    def pop_timings(self):
+        """Return and forget the timings recorded since the last call."""
+        timings, self.timings = self.timings, []
+        return timings
+
+    # -- Account --------------------------------------------------------------
+    def create_user(self, username, password):
+        return self.request("POST", "/Account/v1/User",
+                            json={"userName": username, "password": password})
+
+    def generate_token(self, username, password):
+        return self.request("POST", "/Account/v1/GenerateToken",
+                            json={"userName": username, "password": password})
+
+    def get_token(self, username, password):
+        """Return a valid token, logging in only when none is cached.
+
+        One login serves every scenario of the run until the token expires.
+        """
+        key = (self.base_url, username)
+        with _tokens_lock:
+            cached = _tokens.get(key)
+        if cached and cached[1] - time.time() > 30:
+            return cached[0]
+
+        response = self.generate_token(username, password)
+        response.raise_for_status()
+        data = response.json()
+        token = data.get("token")
+        if not token:
+            raise RuntimeError("Login failed for %s: %s"
+                               % (username, data.get("result")))
+        with _tokens_lock:
+            _tokens[key] = (token, _parse_expires(data.get("expires")))
+        return token
+
+    def authorized(self, username, password):
+        return self.request("POST", "/Account/v1/Authorized",
+                            json={"userName": username, "password": password})
+
+    def get_user(self, user_id, token):
+        return self.request("GET", "/Account/v1/User/%s" % user_id,
+                            token=token)
+
+    def delete_user(self, user_id, token):
+        return self.request("DELETE", "/Account/v1/User/%s" % user_id,
+                            token=token)
+
+    # -- Book store -----------------------------------------------------------
+    def list_books(self):
+        return self.request("GET", "/BookStore/v1/Books")
+
+    def get_book(self, isbn):
+        return self.request("GET", "/BookStore/v1/Book",
+                            params={"ISBN": isbn})
+
+    def add_books(self, user_id, isbns, token):
+        payload = {"userId": user_id,
+                   "collectionOfIsbns": [{"isbn": isbn} for isbn in isbns]}
+        return self.request("POST", "/BookStore/v1/Books", token=token,
+                            json=payload)
+
+    def delete_book(self, user_id, isbn, token):
+        return self.request("DELETE", "/BookStore/v1/Book", token=token,
+                            json={"isbn": isbn, "userId": user_id})
+
+    def delete_books(self, user_id, token):
+        return self.request("DELETE", "/BookStore/v1/Books", token=token,
+                            params={"UserId": user_id})
+
+
+@fixture
+def api_client(context, base_url=None, timeout=DEFAULT_TIMEOUT,
+               **session_options):
+    """Provide ``context.api_client`` backed by the worker's pooled session.
+
+    ``session_options`` are passed to ``build_session`` (``pool_maxsize``,
+    ``pool_block``, ``retries``, ``backoff_factor``) the first time the
+    worker's session is created. A session stored as ``context.api_session``
+    before the run (e.g. one per virtual user in load mode) is used instead.
+    """
+    session = getattr(context, "api_session", None)
+    if session is None:
+        session = get_session(**session_options)
+    client = ApiClient(base_url, session=session, timeout=timeout)
+    context.api_client = client
+    yield client
+    # -- The session stays open so the next scenario reuses its connections.
+    client.pop_timings()
+
+
+def attach_step_timings(context, step):
+    """Move the HTTP timings of the finished step onto the step itself.
+
+    Meant for ``after_step``, which behave calls before the formatters see
+    the step result. The timings end up in ``step.api_timings``: the
+    ``ndjson`` formatter writes them into the step event and the ``profile``
+    formatter reports them per endpoint. They are also logged.
+    """
+    client = getattr(context, "api_client", None)
+    if client is None:
+        return
+    step.api_timings = client.pop_timings()
+    for timing in step.api_timings:
+        if timing.status is None:
+            log.info("%s %s -> %s after %.3fs", timing.method,
+                     timing.endpoint, timing.error, timing.total)
+        else:
+            log.info("%s %s -> %s in %.3fs (ttfb %.3fs)", timing.method,
+                     timing.endpoint, timing.status, timing.total, timing.ttfb)
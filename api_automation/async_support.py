@@ -0,0 +1,173 @@
+"""Run ``async def`` steps, hooks and fixtures on one shared event loop.
+
+behave calls steps and hooks synchronously. The ``event_loop`` fixture
+creates one asyncio loop for the whole run and stores it as
+``context.event_loop``. The decorators below run coroutines on that loop,
+so async code never needs a loop or threads of its own.
+
+Example::
+
+    # -- FILE: features/environment.py
+    def before_all(context):
+        use_fixture(event_loop, context)
+        use_fixture(api_client, context, pool_maxsize=50)
+
+    # -- FILE: features/steps/api_steps.py
+    @when("I add {count:d} books to the user collection")
+    @async_step
+    async def step_add_books(context, count):
+        client = context.api_client
+        context.responses = await fan_out(
+            client.add_books,
+            [(context.user_id, [isbn], context.token)
+             for isbn in context.isbns[:count]],
+            concurrency=50)
+"""
+
+import asyncio
+import functools
+import inspect
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from behave.fixture import InvalidFixtureError, fixture, use_fixture
+
+DEFAULT_CONCURRENCY = 20
+
+
+@fixture
+def event_loop(context):
+    """Create the run's event loop.
+
+    Use it from ``before_all`` so the loop lives until the run ends.
+    """
+    loop = asyncio.new_event_loop()
+    context.event_loop = loop
+    yield loop
+    try:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+    finally:
+        loop.close()
+
+
+def get_event_loop(context):
+    """Return ``context.event_loop`` and create it if no fixture set it up.
+
+    A loop created here belongs to the current context layer. It only lives
+    for the whole run if it is first used from ``before_all``.
+    """
+    loop = getattr(context, "event_loop", None)
+    if loop is None or loop.is_closed():
+        loop = use_fixture(event_loop, context)
+    return loop
+
+
+def run_async(context, coroutine):
+    """Run ``coroutine`` on the shared loop and return its result.
+
+    The loop cannot be re-entered: an async step that runs further async
+    steps (e.g. with ``context.execute_steps()``) gets a ``RuntimeError``.
+    Await the other coroutines directly instead.
+    """
+    loop = get_event_loop(context)
+    if loop.is_running():
+        coroutine.close()
+        raise RuntimeError(
+            "The shared event loop is already running: %s was called from "
+            "inside an async step or hook (e.g. via context.execute_steps()). "
+            "Await the coroutine directly instead."
+            % getattr(coroutine, "__qualname__", coroutine))
+    return loop.run_until_complete(coroutine)
+
+
+def async_step(func):
+    """Turn an ``async def`` step or hook into one that behave can call.
+
+    It works for steps (``context, *args``) and hooks (``context, feature``,
+    ``context, scenario``, ...) alike.
+    """
+    if not inspect.iscoroutinefunction(func):
+        raise TypeError("async_step expects an async function: %r" % func)
+
+    @functools.wraps(func)
+    def wrapper(context, *args, **kwargs):
+        return run_async(context, func(context, *args, **kwargs))
+    return wrapper
+
+
+# -- ALIAS: Same decorator, reads better in environment.py
+async_hook = async_step
+
+
+def async_fixture(func):
+    """Turn an ``async def`` fixture into one ``use_fixture`` can handle.
+
+    Async-generator fixtures keep the setup/cleanup split of normal fixtures:
+    the part before ``yield`` is the setup and the part after it runs when
+    the context layer is removed.
+    """
+    if inspect.isasyncgenfunction(func):
+        def generator(context, loop, *args, **kwargs):
+            agen = func(context, *args, **kwargs)
+            yield loop.run_until_complete(agen.__anext__())
+            try:
+                loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            raise InvalidFixtureError("Has more than one yield: %r" % func)
+
+        @functools.wraps(func)
+        def wrapper(context, *args, **kwargs):
+            # -- Get (or create) the loop first: Its cleanup is registered
+            #    before ours and therefore runs after it.
+            loop = get_event_loop(context)
+            return use_fixture(generator, context, loop, *args, **kwargs)
+        return wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        def wrapper(context, *args, **kwargs):
+            return run_async(context, func(context, *args, **kwargs))
+        return wrapper
+
+    raise TypeError("async_fixture expects an async function: %r" % func)
+
+
+async def fan_out(func, args_list, concurrency=DEFAULT_CONCURRENCY):
+    """Call the blocking ``func`` once per item of ``args_list`` concurrently.
+
+    The calls run in a thread pool of ``concurrency`` threads, so that many
+    calls are in flight at once. Results come back in the order of
+    ``args_list``. An item that is not a tuple is passed as a single argument.
+    The first failure is raised once every started call has finished.
+
+    If ``func`` is an ``ApiClient`` method, ``concurrency`` should not exceed
+    the client's ``pool_maxsize``: extra threads would wait for a connection.
+    A warning is issued in that case.
+    """
+    args_list = [args if isinstance(args, tuple) else (args,)
+                 for args in args_list]
+    pool_maxsize = getattr(getattr(func, "__self__", None), "pool_maxsize", None)
+    if pool_maxsize is not None and concurrency > pool_maxsize:
+        warnings.warn("fan_out(concurrency=%d) exceeds the client's "
+                      "pool_maxsize=%d: only %d calls run at once"
+                      % (concurrency, pool_maxsize, pool_maxsize), stacklevel=2)
+
+    loop = asyncio.get_running_loop()
+    workers = max(1, min(concurrency, len(args_list)))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="api-fan-out") as executor:
+        results = await asyncio.gather(
+            *[loop.run_in_executor(executor, functools.partial(func, *args))
+              for args in args_list],
+            return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def run_concurrently(context, func, args_list, concurrency=DEFAULT_CONCURRENCY):
+    """Synchronous ``fan_out`` for plain (non-async) steps."""
+    return run_async(context, fan_out(func, args_list, concurrency))
@@ -0,0 +1,336 @@
+"""Local in-memory stand-in for the DemoQA book store API.
+
+It implements the Account and BookStore endpoints that ``ApiClient`` uses,
+so the API suite and the load mode can run offline::
+
+    python bookstore_stub.py --port 8000
+    BOOKSTORE_BASE_URL=http://127.0.0.1:8000 behave features
+
+From ``environment.py``, ``use_fixture(bookstore_stub, context)`` starts the
+server on a free port and returns its base URL.
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from behave.fixture import fixture
+
+BOOKS = [
+    ("9781449325862", "Git Pocket Guide", "Richard E. Silverman", 234),
+    ("9781449331818", "Learning JavaScript Design Patterns", "Addy Osmani", 254),
+    ("9781449337711", "Designing Evolvable Web APIs with ASP.NET",
+     "Glenn Block et al.", 238),
+    ("9781449365035", "Speaking JavaScript", "Axel Rauschmayer", 460),
+    ("9781491904244", "You Don't Know JS", "Kyle Simpson", 278),
+    ("9781491950296", "Programming JavaScript Applications", "Eric Elliott", 254),
+    ("9781593275846", "Eloquent JavaScript, Second Edition", "Marijn Haverbeke", 472),
+    ("9781593277574", "Understanding ECMAScript 6", "Nicholas C. Zakas", 352),
+]
+PASSWORD_PATTERN = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?=.*\W).{8,}$")
+TOKEN_TTL = timedelta(days=7)
+
+
+def make_catalog():
+    return dict((isbn, {"isbn": isbn, "title": title, "subTitle": "",
+                        "author": author, "publish_date": "2020-06-04T08:48:39.000Z",
+                        "publisher": "O'Reilly Media", "pages": pages,
+                        "description": title, "website": "https://demoqa.com"})
+                for isbn, title, author, pages in BOOKS)
+
+
+class BookStore(object):
+    """In-memory users, tokens and book collections (thread-safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.catalog = make_catalog()
+        self.users = {}             # user_id -> {"username", "password", "books"}
+        self.user_ids = {}          # username -> user_id
+        self.tokens = {}            # token -> user_id
+
+    def authenticate(self, authorization):
+        if not authorization or not authorization.startswith("Bearer "):
+            return None
+        return self.tokens.get(authorization[len("Bearer "):])
+
+
+class BookStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BookStoreStub/1.0"
+    # -- Headers and body go out in separate writes: Avoid Nagle delays.
+    disable_nagle_algorithm = True
+
+    # -- HTTP plumbing ----------------------------------------------------------
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return None
+
+    def send_json(self, status, data=None):
+        body = b"" if data is None else json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, code, message):
+        self.send_json(status, {"code": str(code), "message": message})
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = dict((key, values[0]) for key, values
+                          in parse_qs(url.query).items())
+        for route_method, pattern, handler in ROUTES:
+            if route_method != method:
+                continue
+            match = pattern.match(url.path)
+            if match:
+                return handler(self, *match.groups())
+        self.send_error_json(404, 404, "Not found: %s %s" % (method, url.path))
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    # -- Account ----------------------------------------------------------------
+    def credentials(self):
+        data = self.read_json()
+        if not data or not data.get("userName") or not data.get("password"):
+            self.send_error_json(400, 1200, "UserName and Password required.")
+            return None, None
+        return data["userName"], data["password"]
+
+    def create_user(self):
+        username, password = self.credentials()
+        if username is None:
+            return
+        if not PASSWORD_PATTERN.match(password):
+            return self.send_error_json(
+                400, 1300, "Passwords must have at least one non alphanumeric "
+                "character, one digit ('0'-'9'), one uppercase ('A'-'Z'), one "
+                "lowercase ('a'-'z'), one special character and Password must "
+                "be eight characters or longer.")
+        with self.store.lock:
+            if username in self.store.user_ids:
+                return self.send_error_json(406, 1204, "User exists!")
+            user_id = str(uuid.uuid4())
+            self.store.user_ids[username] = user_id
+            self.store.users[user_id] = {"username": username,
+                                         "password": password, "books": []}
+        self.send_json(201, {"userID": user_id, "username": username,
+                             "books": []})
+
+    def generate_token(self):
+        username, password = self.credentials()
+        if username is None:
+            return
+        with self.store.lock:
+            user_id = self.store.user_ids.get(username)
+            user = self.store.users.get(user_id)
+            if user is None or user["password"] != password:
+                return self.send_json(200, {
+                    "token": None, "expires": None, "status": "Failed",
+                    "result": "User authorization failed."})
+            token = uuid.uuid4().hex
+            self.store.tokens[token] = user_id
+        expires = (datetime.now(timezone.utc) + TOKEN_TTL).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        self.send_json(200, {"token": token, "expires": expires,
+                             "status": "Success",
+                             "result": "User authorized successfully."})
+
+    def authorized(self):
+        username, password = self.credentials()
+        if username is None:
+            return
+        with self.store.lock:
+            user = self.store.users.get(self.store.user_ids.get(username))
+        if user is None:
+            return self.send_error_json(404, 1207, "User not found!")
+        self.send_json(200, user["password"] == password)
+
+    def authorized_user(self, user_id):
+        """Return the user for ``user_id`` if the bearer token belongs to it."""
+        token_user = self.store.authenticate(self.headers.get("Authorization"))
+        if token_user is None:
+            self.send_error_json(401, 1200, "User not authorized!")
+            return None
+        if user_id not in self.store.users:
+            self.send_error_json(401, 1207, "User not found!")
+            return None
+        if token_user != user_id:
+            self.send_error_json(401, 1200, "User not authorized!")
+            return None
+        return self.store.users[user_id]
+
+    def get_user(self, user_id):
+        with self.store.lock:
+            user = self.authorized_user(user_id)
+            if user is None:
+                return
+            books = [self.store.catalog[isbn] for isbn in user["books"]]
+        self.send_json(200, {"userId": user_id, "username": user["username"],
+                             "books": books})
+
+    def delete_user(self, user_id):
+        with self.store.lock:
+            user = self.authorized_user(user_id)
+            if user is None:
+                return
+            del self.store.users[user_id]
+            del self.store.user_ids[user["username"]]
+            for token in [token for token, owner in self.store.tokens.items()
+                          if owner == user_id]:
+                del self.store.tokens[token]
+        self.send_json(204)
+
+    # -- Book store -------------------------------------------------------------
+    def list_books(self):
+        self.send_json(200, {"books": list(self.store.catalog.values())})
+
+    def get_book(self):
+        book = self.store.catalog.get(self.query.get("ISBN"))
+        if book is None:
+            return self.send_error_json(
+                400, 1205, "ISBN supplied is not available in Books Collection!")
+        self.send_json(200, book)
+
+    def add_books(self):
+        data = self.read_json() or {}
+        user_id = data.get("userId")
+        isbns = [item.get("isbn") for item in data.get("collectionOfIsbns") or []]
+        with self.store.lock:
+            user = self.authorized_user(user_id)
+            if user is None:
+                return
+            if not isbns or any(isbn not in self.store.catalog for isbn in isbns):
+                return self.send_error_json(
+                    400, 1205, "ISBN supplied is not available in Books Collection!")
+            if any(isbn in user["books"] for isbn in isbns):
+                return self.send_error_json(
+                    400, 1210, "ISBN already present in the User's Collection!")
+            user["books"].extend(isbns)
+        self.send_json(201, {"books": [{"isbn": isbn} for isbn in isbns]})
+
+    def delete_books(self):
+        user_id = self.query.get("UserId")
+        with self.store.lock:
+            user = self.authorized_user(user_id)
+            if user is None:
+                return
+            user["books"] = []
+        self.send_json(204)
+
+    def delete_book(self):
+        data = self.read_json() or {}
+        with self.store.lock:
+            user = self.authorized_user(data.get("userId"))
+            if user is None:
+                return
+            if data.get("isbn") not in user["books"]:
+                return self.send_error_json(
+                    400, 1206, "ISBN supplied is not available in User's Collection!")
+            user["books"].remove(data["isbn"])
+        self.send_json(204)
+
+
+ROUTES = [(method, re.compile("^%s$" % pattern), handler) for method, pattern, handler in [
+    ("POST", "/Account/v1/User", BookStoreHandler.create_user),
+    ("POST", "/Account/v1/GenerateToken", BookStoreHandler.generate_token),
+    ("POST", "/Account/v1/Authorized", BookStoreHandler.authorized),
+    ("GET", "/Account/v1/User/([^/]+)", BookStoreHandler.get_user),
+    ("DELETE", "/Account/v1/User/([^/]+)", BookStoreHandler.delete_user),
+    ("GET", "/BookStore/v1/Books", BookStoreHandler.list_books),
+    ("POST", "/BookStore/v1/Books", BookStoreHandler.add_books),
+    ("DELETE", "/BookStore/v1/Books", BookStoreHandler.delete_books),
+    ("GET", "/BookStore/v1/Book", BookStoreHandler.get_book),
+    ("DELETE", "/BookStore/v1/Book", BookStoreHandler.delete_book),
+]]
+
+
+class BookStoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address=("127.0.0.1", 0), verbose=False):
+        ThreadingHTTPServer.__init__(self, address, BookStoreHandler)
+        self.store = BookStore()
+        self.verbose = verbose
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+
+def start_server(host="127.0.0.1", port=0, verbose=False):
+    """Start a server in a background thread; ``port=0`` picks a free port."""
+    server = BookStoreServer((host, port), verbose=verbose)
+    thread = threading.Thread(target=server.serve_forever,
+                              name="bookstore-stub", daemon=True)
+    thread.start()
+    return server
+
+
+@fixture
+def bookstore_stub(context, port=0):
+    """Run the stand-in server for the current context layer.
+
+    Sets ``context.bookstore_url``; pass it as ``base_url`` to the
+    ``api_client`` fixture.
+    """
+    server = start_server(port=port)
+    context.bookstore_url = server.base_url
+    yield server.base_url
+    server.shutdown()
+    server.server_close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the book store stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log every request.")
+    options = parser.parse_args(args)
+
+    server = BookStoreServer((options.host, options.port), verbose=options.verbose)
+    print("Book store stub listening on %s" % server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
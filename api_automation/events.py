@@ -0,0 +1,481 @@
+"""Streaming test-run events: NDJSON formatter, incremental JUnit, converter.
+
+``NDJsonFormatter`` ("ndjson") writes one JSON line per step, scenario and
+feature and flushes after each line, so a dashboard can tail the file while
+the run is going. ``JUnitStreamFormatter`` ("junit.stream") writes one
+``<testcase>`` per scenario. Neither keeps more than the current scenario in
+memory.
+
+Step events are written as each step finishes. A formatter only learns that
+a scenario is over (including its ``after_scenario`` hook) from behave's next
+``scenario()`` call, so scenario events and testcases lag one scenario
+behind: they are written after the next scenario's ``before_tag`` and
+``before_scenario`` hooks, or, for the last scenario of a feature, at the end
+of the feature after ``after_feature``.
+
+Streams from one or more runs (or CI shards) can be converted offline into
+behave's JSON format or into one JUnit file per feature::
+
+    behave -f ndjson -o reports/run.ndjson
+    python events.py json reports/run.json shard1.ndjson shard2.ndjson
+    python events.py junit reports/junit shard1.ndjson shard2.ndjson
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+from behave.formatter.base import Formatter
+from behave.model_core import Status
+
+JSON_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+# -----------------------------------------------------------------------------
+# EVENT COLLECTION
+# -----------------------------------------------------------------------------
+class EventFormatter(Formatter):
+    """Turns formatter callbacks into step/scenario/feature event dicts.
+
+    Subclasses write the events in ``emit_step()``, ``emit_scenario()`` and
+    ``emit_feature()``.
+    """
+
+    def __init__(self, stream_opener, config):
+        super(EventFormatter, self).__init__(stream_opener, config)
+        self.current_feature = None
+        self.current_scenario = None
+        self.current_steps = []
+        self._match = None
+
+    # -- Formatter API ----------------------------------------------------------
+    def feature(self, feature):
+        self.current_feature = feature
+
+    def scenario(self, scenario):
+        self.finish_current_scenario()
+        self.current_scenario = scenario
+
+    def match(self, match):
+        self._match = match
+
+    def result(self, step):
+        event = self.make_step_event(step, self._match)
+        self._match = None
+        self.current_steps.append((step, event))
+        self.emit_step(event)
+
+    def eof(self):
+        self.finish_current_scenario()
+        if self.current_feature is not None:
+            self.emit_feature(self.make_feature_event(self.current_feature))
+        self.current_feature = None
+
+    # -- Event construction -----------------------------------------------------
+    def classname(self, feature):
+        filename = os.path.relpath(feature.filename, self.config.base_dir or ".")
+        filename = filename.rsplit(".", 1)[0]
+        return filename.replace("\\", "/").replace("/", ".")
+
+    def make_feature_event(self, feature):
+        event = OrderedDict([
+            ("event", "feature"),
+            ("keyword", feature.keyword),
+            ("name", feature.name),
+            ("tags", list(feature.tags)),
+            ("location", str(feature.location)),
+            ("classname", self.classname(feature)),
+            ("status", feature.status.name),
+            ("duration", feature.duration),
+        ])
+        if feature.description:
+            event["description"] = feature.description
+        if feature.hook_failed:
+            event["hook_failed"] = True
+        return event
+
+    def make_scenario_event(self, scenario):
+        event = OrderedDict([
+            ("event", "scenario"),
+            ("feature", str(self.current_feature.location)),
+            ("keyword", scenario.keyword),
+            ("name", scenario.name),
+            ("tags", list(scenario.tags)),
+            ("location", str(scenario.location)),
+            ("status", scenario.status.name),
+            ("duration", scenario.duration),
+        ])
+        if scenario.description:
+            event["description"] = scenario.description
+        if getattr(scenario, "error_message", None):
+            # -- Hook failure: No failing step to report.
+            event["error_message"] = scenario.error_message
+            event["exception_type"] = scenario.exception.__class__.__name__
+        return event
+
+    @staticmethod
+    def make_match_data(match):
+        arguments = []
+        for argument in match.arguments or []:
+            value = argument.value
+            if not isinstance(value, JSON_SCALAR_TYPES):
+                value = argument.original
+            data = {"value": value}
+            if argument.name:
+                data["name"] = argument.name
+            if argument.original != value:
+                data["original"] = argument.original
+            arguments.append(data)
+        return {"location": str(match.location), "arguments": arguments}
+
+    def make_step_event(self, step, match=None):
+        event = OrderedDict([
+            ("event", "step"),
+            ("keyword", step.keyword),
+            ("step_type", step.step_type),
+            ("name", step.name),
+            ("location", str(step.location)),
+            ("status", step.status.name),
+            ("duration", step.duration),
+        ])
+        if step.text:
+            event["text"] = step.text
+        if step.table:
+            event["table"] = {"headings": step.table.headings,
+                              "rows": [list(row) for row in step.table.rows]}
+        if match is not None and match.location:
+            event["match"] = self.make_match_data(match)
+        if step.status == Status.failed and step.error_message:
+            event["error_message"] = step.error_message
+        if getattr(step, "api_timings", None):
+            # -- Set by api_client.attach_step_timings() in after_step.
+            event["api_timings"] = [timing.to_dict()
+                                    for timing in step.api_timings]
+        if step.exception is not None:
+            event["exception_type"] = step.exception.__class__.__name__
+            event["exception_message"] = str(step.exception)
+        return event
+
+    def finish_current_scenario(self):
+        scenario = self.current_scenario
+        if scenario is None:
+            return
+
+        # -- Steps after a failure never reach result(): Report them here.
+        reported = set(id(step) for step, _ in self.current_steps)
+        for step in scenario.all_steps:
+            if id(step) not in reported:
+                event = self.make_step_event(step)
+                self.current_steps.append((step, event))
+                self.emit_step(event)
+
+        steps = [event for _, event in self.current_steps]
+        self.emit_scenario(self.make_scenario_event(scenario), steps)
+        self.current_scenario = None
+        self.current_steps = []
+
+    # -- Subclass API -----------------------------------------------------------
+    def emit_step(self, event):
+        pass
+
+    def emit_scenario(self, event, steps):
+        pass
+
+    def emit_feature(self, event):
+        pass
+
+
+class NDJsonFormatter(EventFormatter):
+    """Writes one JSON object per line for each finished step/scenario/feature."""
+    name = "ndjson"
+    description = "Streams step/scenario/feature events as NDJSON."
+
+    def write_event(self, event):
+        stream = self.open()
+        stream.write(json.dumps(event) + "\n")
+        stream.flush()
+
+    def emit_step(self, event):
+        self.write_event(event)
+
+    def emit_scenario(self, event, steps):
+        self.write_event(event)
+
+    def emit_feature(self, event):
+        self.write_event(event)
+
+    def close(self):
+        self.close_stream()
+
+
+class JUnitStreamFormatter(EventFormatter):
+    """Writes JUnit XML incrementally: one ``<testcase>`` per finished scenario.
+
+    A testcase is written when the next scenario starts (see the module
+    docstring), not directly when its own scenario ends. Suite-level counts are not known while the suite is being written, so
+    ``<testsuite>`` carries no counts. Use ``events.py junit`` for the full
+    report.
+    """
+    name = "junit.stream"
+    description = "Writes JUnit XML testcases scenario by scenario."
+
+    def __init__(self, stream_opener, config):
+        super(JUnitStreamFormatter, self).__init__(stream_opener, config)
+        self.header_written = False
+
+    def write(self, text):
+        stream = self.open()
+        if not self.header_written:
+            stream.write(u'<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+            self.header_written = True
+        stream.write(text)
+        stream.flush()
+
+    def feature(self, feature):
+        super(JUnitStreamFormatter, self).feature(feature)
+        suite = ElementTree.Element(u"testsuite")
+        suite.set(u"name", u"%s.%s" % (self.classname(feature), feature.name))
+        text = ElementTree.tostring(suite, encoding="unicode")
+        # -- Open tag only: "<testsuite ... />" -> "<testsuite ...>"
+        self.write(text.replace(u" />", u">") + u"\n")
+
+    def emit_scenario(self, event, steps):
+        classname = u"%s.%s" % (self.classname(self.current_feature),
+                                self.current_feature.name)
+        case, _ = make_testcase(classname, event, steps)
+        self.write(ElementTree.tostring(case, encoding="unicode") + u"\n")
+
+    def emit_feature(self, event):
+        self.write(u"</testsuite>\n")
+
+    def close(self):
+        if self.header_written:
+            self.write(u"</testsuites>\n")
+        self.close_stream()
+
+
+# -----------------------------------------------------------------------------
+# JUNIT SUPPORT
+# -----------------------------------------------------------------------------
+def describe_scenario(scenario, steps):
+    lines = []
+    if scenario["tags"]:
+        lines.append(u" ".join(u"@%s" % tag for tag in scenario["tags"]))
+    lines.append(u"%s: %s" % (scenario["keyword"], scenario["name"]))
+    for step in steps:
+        lines.append(u"    %s %s ... %s in %.3fs" % (
+            step["keyword"], step["name"], step["status"], step["duration"]))
+    return u"\n".join(lines) + u"\n"
+
+
+def make_testcase(classname, scenario, steps):
+    """Build a JUnit ``<testcase>`` from a scenario event and its step events.
+
+    Returns the element and which counter it adds to: "failures", "errors",
+    "skipped" or None.
+    """
+    case = ElementTree.Element(u"testcase")
+    case.set(u"classname", classname)
+    case.set(u"name", scenario["name"] or u"")
+    case.set(u"status", scenario["status"])
+    case.set(u"time", str(round(scenario["duration"], 6)))
+
+    counter = None
+    undefined = [step for step in steps if step["status"] == "undefined"]
+    if scenario["status"] == "failed":
+        failing = [step for step in steps if step["status"] == "failed"]
+        step = (failing or undefined or [None])[0]
+        if step is not None:
+            exception_type = step.get("exception_type")
+            counter, element_name = "failures", u"failure"
+            if exception_type not in (None, "AssertionError"):
+                # -- UNEXPECTED RUNTIME-ERROR:
+                counter, element_name = "errors", u"error"
+            failure = ElementTree.SubElement(case, element_name)
+            failure.set(u"type", exception_type or u"undefined")
+            failure.set(u"message", step.get("exception_message", u""))
+            failure.text = u"\nFailing step: %s %s\nLocation: %s\n%s" % (
+                step["keyword"], step["name"], step["location"],
+                step.get("error_message", u""))
+        else:
+            # -- Hook failure before any step ran.
+            counter = "errors"
+            failure = ElementTree.SubElement(case, u"error")
+            failure.set(u"type", scenario.get("exception_type", u"UnknownError"))
+            failure.set(u"message", scenario.get("error_message", u""))
+    elif scenario["status"] in ("skipped", "untested"):
+        if undefined:
+            counter = "failures"
+            failure = ElementTree.SubElement(case, u"failure")
+            failure.set(u"type", u"undefined")
+            failure.set(u"message", u"Undefined Step: %s" % undefined[0]["name"])
+        else:
+            counter = "skipped"
+            ElementTree.SubElement(case, u"skipped")
+
+    stdout = ElementTree.SubElement(case, u"system-out")
+    stdout.text = describe_scenario(scenario, steps)
+    return case, counter
+
+
+# -----------------------------------------------------------------------------
+# OFFLINE CONVERSION
+# -----------------------------------------------------------------------------
+def read_events(filenames):
+    """Merge event streams into features with their scenarios and steps.
+
+    Returns an ordered mapping ``feature location -> (feature event, list of
+    (scenario event, step events))``. If a feature shows up in several streams
+    (e.g. scenario-level shards), its scenarios are merged by location (see
+    ``merge_feature``).
+    """
+    features = OrderedDict()
+    for filename in filenames:
+        pending_steps = []
+        pending_scenarios = []
+        with open(filename) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event["event"]
+                if kind == "step":
+                    pending_steps.append(event)
+                elif kind == "scenario":
+                    pending_scenarios.append((event, pending_steps))
+                    pending_steps = []
+                elif kind == "feature":
+                    merge_feature(features, event, pending_scenarios)
+                    pending_scenarios = []
+        if pending_scenarios:
+            # -- Run was interrupted: Keep what finished.
+            sys.stderr.write("%s: incomplete feature at end of stream\n"
+                             % filename)
+    return features
+
+
+NOT_RUN = ("skipped", "untested")
+
+
+def merge_feature(features, event, scenarios):
+    """Add a feature event and its scenarios to ``features``.
+
+    A scenario that is already known (same location) is replaced if the new
+    one ran: a shard reports the scenarios it did not select as skipped, and
+    a later stream (a rerun) wins over an earlier one. Otherwise the known
+    result is kept. The feature status and duration are then derived from
+    its scenarios (and feature hook failures), so reruns are not counted
+    twice.
+    """
+    known = features.get(event["location"])
+    if known is None:
+        features[event["location"]] = known = (event, [])
+    elif event.get("hook_failed"):
+        known[0]["hook_failed"] = True
+    feature, known_scenarios = known
+    positions = dict((scenario["location"], index)
+                     for index, (scenario, _) in enumerate(known_scenarios))
+    for scenario, steps in scenarios:
+        index = positions.get(scenario["location"])
+        if index is None:
+            positions[scenario["location"]] = len(known_scenarios)
+            known_scenarios.append((scenario, steps))
+        elif scenario["status"] not in NOT_RUN:
+            known_scenarios[index] = (scenario, steps)
+
+    if known_scenarios:
+        feature["duration"] = sum(scenario["duration"]
+                                  for scenario, _ in known_scenarios)
+    statuses = set(scenario["status"] for scenario, _ in known_scenarios)
+    if feature.get("hook_failed"):
+        statuses.add("failed")
+    elif not known_scenarios:
+        statuses.add(event["status"])
+    for status in ("failed", "passed", "skipped", "untested"):
+        if status in statuses:
+            feature["status"] = status
+            break
+
+
+def to_json_data(features):
+    """Convert merged events to behave's JSON formatter layout."""
+    data = []
+    for feature, scenarios in features.values():
+        feature_data = OrderedDict(
+            (key, feature[key]) for key in
+            ("keyword", "name", "tags", "location", "status", "description")
+            if key in feature)
+        elements = feature_data["elements"] = []
+        for scenario, steps in scenarios:
+            element = OrderedDict([("type", "scenario")])
+            element.update((key, scenario[key]) for key in
+                           ("keyword", "name", "tags", "location", "description")
+                           if key in scenario)
+            element["steps"] = [to_json_step(step) for step in steps]
+            element["status"] = scenario["status"]
+            elements.append(element)
+        data.append(feature_data)
+    return data
+
+
+def to_json_step(step):
+    data = OrderedDict((key, step[key]) for key in
+                       ("keyword", "step_type", "name", "location", "text",
+                        "table", "match", "api_timings") if key in step)
+    if step["status"] not in ("skipped", "untested", "undefined") or "match" in step:
+        result = data["result"] = OrderedDict([("status", step["status"]),
+                                               ("duration", step["duration"])])
+        if "error_message" in step:
+            result["error_message"] = step["error_message"]
+    return data
+
+
+def write_junit(features, directory):
+    """Write one ``TESTS-<classname>.xml`` per feature, like behave's reporter."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for feature, scenarios in features.values():
+        classname = u"%s.%s" % (feature["classname"], feature["name"])
+        suite = ElementTree.Element(u"testsuite")
+        suite.set(u"name", classname)
+        counts = {"failures": 0, "errors": 0, "skipped": 0}
+        for scenario, steps in scenarios:
+            case, counter = make_testcase(classname, scenario, steps)
+            if counter:
+                counts[counter] += 1
+            suite.append(case)
+        suite.set(u"tests", str(len(scenarios)))
+        suite.set(u"errors", str(counts["errors"]))
+        suite.set(u"failures", str(counts["failures"]))
+        suite.set(u"skipped", str(counts["skipped"]))
+        suite.set(u"time", str(round(feature["duration"], 6)))
+        filename = os.path.join(directory, "TESTS-%s.xml" % feature["classname"])
+        ElementTree.ElementTree(suite).write(filename, encoding="UTF-8",
+                                             xml_declaration=True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Convert (and merge) NDJSON event streams.")
+    parser.add_argument("format", choices=("json", "junit"))
+    parser.add_argument("output",
+                        help="JSON file, or directory for the JUnit files.")
+    parser.add_argument("streams", nargs="+", help="NDJSON event files.")
+    options = parser.parse_args(args)
+
+    features = read_events(options.streams)
+    if options.format == "json":
+        with open(options.output, "w") as f:
+            json.dump(to_json_data(features), f, indent=2)
+            f.write("\n")
+    else:
+        write_junit(features, options.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""On-disk cache of parsed feature files.
+
+``history.py``, ``parallel.py`` and every load-mode user or worker thread
+parse the whole feature tree before they run anything. ``parse_file`` and
+``parse_features`` work like behave's functions of the same name, but keep
+the parsed ``Feature`` model as a pickle in ``.behave_cache/``::
+
+    from feature_cache import parse_features
+    features = parse_features(["features/books.feature"], language="en")
+
+An entry is keyed by the feature path, the Gherkin language, the behave
+version and the scenario outline naming schema. It is reused while the
+file's mtime and size are unchanged. If they changed, the SHA-256 of the
+content decides whether the file must be parsed again. Scenario outlines are
+stored with their scenarios already expanded, because expanding them takes
+longer than parsing. Every call returns a fresh copy, so runners in several
+threads never share model objects. Set ``BEHAVE_FEATURE_CACHE=`` (empty) to
+turn the cache off.
+
+Worker processes of ``parallel.py`` run plain ``behave`` and parse without
+the cache.
+"""
+
+import copyreg
+import hashlib
+import os
+import pickle
+import threading
+
+import behave
+from behave import parser
+from behave.model import ScenarioOutline, Tag
+from behave.model_core import FileLocation
+from behave.runner_util import FeatureScenarioLocationCollector
+
+DEFAULT_DIRECTORY = os.environ.get("BEHAVE_FEATURE_CACHE", ".behave_cache")
+
+# -- Tag is a str subclass whose __new__ also needs the line number.
+copyreg.pickle(Tag, lambda tag: (Tag, (str(tag), tag.line)))
+
+
+def cache_filename(filename, language, directory):
+    # -- Outlines are cached expanded: Their names depend on the schema.
+    key = u"\0".join([behave.__version__, language or u"",
+                      ScenarioOutline.annotation_schema, filename,
+                      os.path.abspath(filename)])
+    return os.path.join(directory,
+                        hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+
+def parse_file(filename, language=None, directory=DEFAULT_DIRECTORY):
+    """Return the parsed ``Feature`` of ``filename`` (or None), cached."""
+    if not directory:
+        return parser.parse_file(filename, language=language)
+
+    stat = os.stat(filename)
+    entry_file = cache_filename(filename, language, directory)
+    entry = None
+    try:
+        with open(entry_file, "rb") as f:
+            entry = pickle.load(f)
+    except (OSError, EOFError, pickle.PickleError, AttributeError, ImportError):
+        pass
+    if entry and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size):
+        return pickle.loads(entry["feature"])
+
+    with open(filename, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry["sha256"] == digest:
+        feature = pickle.loads(entry["feature"])
+    else:
+        feature = parser.parse_feature(data.decode("utf8"), language, filename)
+        if feature:
+            # -- Expand scenario outlines once: It costs more than parsing.
+            for _ in feature.walk_scenarios():
+                pass
+    entry = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest,
+             "feature": pickle.dumps(feature, pickle.HIGHEST_PROTOCOL)}
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # -- Write and rename: Parallel workers may read the entry meanwhile.
+    temp_file = "%s.%d.%d.tmp" % (entry_file, os.getpid(), threading.get_ident())
+    with open(temp_file, "wb") as f:
+        pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, entry_file)
+    return feature
+
+
+def parse_features(feature_files, language=None, directory=DEFAULT_DIRECTORY):
+    """Cached ``behave.runner_util.parse_features``.
+
+    Handles file names and ``file:line`` locations like behave does.
+    """
+    scenario_collector = FeatureScenarioLocationCollector()
+    features = []
+    for location in feature_files:
+        if not isinstance(location, FileLocation):
+            location = FileLocation(os.path.normpath(location))
+
+        if location.filename == scenario_collector.filename:
+            scenario_collector.add_location(location)
+            continue
+        elif scenario_collector.feature:
+            features.append(scenario_collector.build_feature())
+            scenario_collector.clear()
+
+        feature = parse_file(os.path.abspath(location.filename), language,
+                             directory)
+        if feature:
+            scenario_collector.feature = feature
+            scenario_collector.add_location(location)
+    if scenario_collector.feature:
+        features.append(scenario_collector.build_feature())
+    return features
@@ -0,0 +1,298 @@
+"""Scenario duration history for balanced CI shards and failed-first runs.
+
+After each run, the scenario events of the ``ndjson`` formatter (see
+``events.py``) are stored in a local SQLite file. ``select`` then splits all
+scenarios into shards with about the same historical duration and writes the
+chosen ``file:line`` locations to a list that behave reads with ``@``::
+
+    behave -f ndjson -o reports/run.ndjson
+    python history.py record reports/run.ndjson
+    python history.py select --shard 1/4 --order failed-first \\
+        -o reports/shard.txt features
+    behave @reports/shard.txt
+
+``-t/--tags`` and ``-n/--name`` select scenarios as in behave; only the
+selected scenarios are split into shards.
+
+A shard can be empty, e.g. with more shards than selected scenarios. behave
+fails on an empty location list, so ``select`` then writes no list (and
+removes an old one at ``-o``) and exits with ``EMPTY_SHARD`` (3). CI can skip
+the behave run on that exit code::
+
+    python history.py select --shard 5/8 -o reports/shard.txt features
+    case $? in
+        0) behave @reports/shard.txt ;;
+        3) echo "Empty shard, skipped" ;;
+        *) exit 1 ;;
+    esac
+
+behave runs the locations feature by feature, in the order in which each
+feature file first appears in the list. Inside a feature, scenarios keep
+their file order. The ordering modes therefore move whole features.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from behave.configuration import Configuration
+from behave.runner_util import collect_feature_locations
+
+from feature_cache import parse_file
+
+DEFAULT_DATABASE = os.environ.get("BEHAVE_HISTORY_DB", ".behave_history.sqlite")
+HISTORY_SIZE = 5
+EMPTY_SHARD = 3
+ORDERS = ("file", "failed-first", "slowest-first")
+
+
+class DurationHistory(object):
+    """Per-scenario durations and outcomes keyed by ``FileLocation`` string."""
+
+    def __init__(self, filename=DEFAULT_DATABASE):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " location TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " duration REAL NOT NULL,"
+            " recorded_at REAL NOT NULL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_location"
+            " ON results (location, recorded_at)")
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, results, recorded_at=None):
+        """Store ``(location, status, duration)`` tuples of one run.
+
+        Only the last ``HISTORY_SIZE`` results of each scenario are kept.
+        """
+        recorded_at = recorded_at or time.time()
+        locations = set(location for location, _, _ in results)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?)",
+                [(location, status, duration, recorded_at)
+                 for location, status, duration in results])
+            self.connection.executemany(
+                "DELETE FROM results WHERE location = ? AND rowid NOT IN ("
+                " SELECT rowid FROM results WHERE location = ?"
+                " ORDER BY recorded_at DESC, rowid DESC LIMIT ?)",
+                [(location, location, HISTORY_SIZE) for location in locations])
+
+    def record_events(self, filenames):
+        """Store the scenario events of NDJSON streams; returns their count."""
+        results = []
+        for filename in filenames:
+            with open(filename) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event["event"] == "scenario" and \
+                            event["status"] in ("passed", "failed"):
+                        results.append((event["location"], event["status"],
+                                        event["duration"]))
+        self.record(results)
+        return len(results)
+
+    def stats(self):
+        """Return ``location -> (mean duration, last status)`` over the last
+        ``HISTORY_SIZE`` runs of each scenario.
+        """
+        rows = self.connection.execute(
+            "SELECT location, status, duration FROM results"
+            " ORDER BY location, recorded_at DESC")
+        stats = {}
+        recent = {}
+        for location, status, duration in rows:
+            durations = recent.setdefault(location, [])
+            if len(durations) >= HISTORY_SIZE:
+                continue
+            durations.append(duration)
+            if location not in stats:
+                stats[location] = [0.0, status]
+        for location, durations in recent.items():
+            stats[location][0] = sum(durations) / len(durations)
+        return dict((location, tuple(value)) for location, value in stats.items())
+
+
+def collect_scenario_locations(paths, language=None, config=None):
+    """Return the ``file:line`` location of every scenario (and outline row).
+
+    With a behave ``config``, only scenarios selected by its tags and names
+    are returned.
+    """
+    locations = []
+    seen_files = set()
+    for location in collect_feature_locations(paths):
+        if location.filename in seen_files:
+            continue
+        seen_files.add(location.filename)
+        feature = parse_file(location.filename, language=language)
+        if feature is None:
+            continue
+        for scenario in feature.walk_scenarios():
+            if config is None or (
+                    scenario.should_run_with_tags(config.tags) and
+                    scenario.should_run_with_name_select(config)):
+                locations.append(str(scenario.location))
+    return locations
+
+
+def make_estimator(locations, stats):
+    """Return ``location -> expected duration`` for ``locations``.
+
+    Scenarios without history count as the median known duration.
+    """
+    known = sorted(stats[location][0] for location in locations
+                   if location in stats)
+    default = known[len(known) // 2] if known else 1.0
+
+    def expected(location):
+        return stats[location][0] if location in stats else default
+    return expected
+
+
+def split_shards(locations, stats, count):
+    """Split ``locations`` into ``count`` shards of similar expected duration.
+
+    Greedy longest-first: each scenario goes to the shard with the least work
+    so far. Scenarios without history count as the median known duration.
+    """
+    expected = make_estimator(locations, stats)
+    shards = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for location in sorted(locations, key=expected, reverse=True):
+        index = loads.index(min(loads))
+        shards[index].append(location)
+        loads[index] += expected(location)
+    return shards, loads
+
+
+def order_locations(locations, stats, order="file", file_order=None):
+    """Order a shard's locations by feature, as behave will run them.
+
+    ``file`` keeps the order of ``file_order`` (defaults to ``locations``).
+    ``failed-first`` puts features with a scenario that failed last time
+    first. ``slowest-first`` sorts features by their expected duration, with
+    the same default for unknown scenarios as ``split_shards`` (the median
+    over ``file_order``).
+    """
+    file_order = file_order or locations
+    expected = make_estimator(file_order, stats)
+    position = dict((location, index) for index, location in enumerate(file_order))
+    features = {}
+    for location in locations:
+        filename = location.rsplit(":", 1)[0]
+        features.setdefault(filename, []).append(location)
+
+    def feature_key(filename):
+        scenarios = features[filename]
+        first = min(position.get(location, 0) for location in scenarios)
+        if order == "failed-first":
+            failed = any(stats.get(location, (0, None))[1] == "failed"
+                         for location in scenarios)
+            return (not failed, first)
+        elif order == "slowest-first":
+            total = sum(expected(location) for location in scenarios)
+            return (-total, first)
+        return (first,)
+
+    ordered = []
+    for filename in sorted(features, key=feature_key):
+        ordered.extend(sorted(features[filename],
+                              key=lambda location: position.get(location, 0)))
+    return ordered
+
+
+def write_location_list(filename, locations):
+    """Write ``file[:line]`` locations to a list file for ``behave @FILE``."""
+    # -- behave resolves list entries relative to the list file.
+    here = os.path.dirname(os.path.abspath(filename))
+    with open(filename, "w") as f:
+        for location in locations:
+            path, colon, line = location.rpartition(":")
+            if not colon or not line.isdigit():
+                path, colon, line = location, "", ""
+            f.write("%s%s%s\n" % (os.path.relpath(path, here), colon, line))
+
+
+def parse_shard(text):
+    try:
+        index, count = [int(part) for part in text.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected i/N, got %r" % text)
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("shard index out of range: %r" % text)
+    return index, count
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="History database (default: %(default)s).")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    record = commands.add_parser("record", help="Store results of a run.")
+    record.add_argument("streams", nargs="+", help="NDJSON event files.")
+
+    select = commands.add_parser("select", help="Select and order scenarios.")
+    select.add_argument("--shard", type=parse_shard, default=(1, 1),
+                        help="Shard to select, as i/N (default: 1/1).")
+    select.add_argument("--order", choices=ORDERS, default="file")
+    select.add_argument("--lang", default=None, help="Gherkin language.")
+    select.add_argument("-t", "--tags", action="append", default=[],
+                        help="Tag expression to select scenarios (as in behave).")
+    select.add_argument("-n", "--name", action="append", default=[],
+                        help="Select scenarios by name (as in behave).")
+    select.add_argument("-o", "--output", default=None,
+                        help="Location list file for 'behave @FILE'.")
+    select.add_argument("paths", nargs="*", default=["features"])
+    options = parser.parse_args(args)
+
+    history = DurationHistory(options.db)
+    try:
+        if options.command == "record":
+            count = history.record_events(options.streams)
+            print("Recorded %d scenarios in %s" % (count, options.db))
+            return 0
+
+        stats = history.stats()
+        config = Configuration(
+            command_args=["--tags=%s" % tags for tags in options.tags] +
+            ["--name=%s" % name for name in options.name],
+            load_config=False)
+        locations = collect_scenario_locations(options.paths, options.lang,
+                                               config)
+        index, count = options.shard
+        shards, loads = split_shards(locations, stats, count)
+        selected = order_locations(shards[index - 1], stats, options.order,
+                                   file_order=locations)
+    finally:
+        history.close()
+
+    if not selected:
+        if options.output and os.path.exists(options.output):
+            os.remove(options.output)
+        sys.stderr.write("Shard %d/%d: no scenarios, nothing to run\n"
+                         % (index, count))
+        return EMPTY_SHARD
+    if options.output:
+        write_location_list(options.output, selected)
+    else:
+        for location in selected:
+            print(location)
+    sys.stderr.write("Shard %d/%d: %d scenarios, expected %.2fs\n"
+                     % (index, count, len(selected), loads[index - 1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""Load mode: replay the API scenarios as concurrent virtual users.
+
+Each virtual user is a thread with its own behave ``Runner`` and ``Context``.
+It runs the selected features (including ``before_all``/``after_all``) again
+and again until the duration or the iteration count is reached. Users start
+one after another over the ramp-up time. Every user has its own pooled
+``requests.Session`` (``context.api_session``, picked up by the
+``api_client`` fixture), so users do not share connections. Step durations
+are grouped by step definition and HTTP calls by endpoint. Responses with a
+4xx or 5xx status and calls without a response (connection errors, timeouts)
+count as errors; the endpoint table also lists the count per status class,
+with calls without a response as ``failed``::
+
+    python load.py --users 20 --ramp-up 10 --duration 60 -t @load features
+    python load.py --stub --users 5 --iterations 50 --report reports/load.json
+
+``--stub`` starts the in-memory book store of ``bookstore_stub.py`` and
+points ``BOOKSTORE_BASE_URL`` at it, so the run needs no network.
+
+Output capture is turned off, because behave swaps ``sys.stdout`` for the
+whole process and the users share one process (see ``runners.py``).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from behave.formatter.base import Formatter, StreamOpener
+from behave.model import reset_model
+from behave.model_core import Status
+
+import api_client
+from profiler import percentile
+from runners import load_runner, new_context
+
+HISTOGRAM_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Series(object):
+    """Latencies of one step definition or endpoint."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.durations = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, duration, error=False, status_class=None):
+        self.durations.append(duration)
+        if error:
+            self.errors += 1
+        if status_class is not None:
+            self.statuses[status_class] = self.statuses.get(status_class, 0) + 1
+
+    def summary(self, elapsed):
+        values = sorted(self.durations)
+        histogram = OrderedDict(("<=%gs" % bound, 0) for bound in HISTOGRAM_BOUNDS)
+        histogram[">%gs" % HISTOGRAM_BOUNDS[-1]] = 0
+        for value in values:
+            for bound in HISTOGRAM_BOUNDS:
+                if value <= bound:
+                    histogram["<=%gs" % bound] += 1
+                    break
+            else:
+                histogram[">%gs" % HISTOGRAM_BOUNDS[-1]] += 1
+        data = OrderedDict([
+            ("count", len(values)),
+            ("errors", self.errors),
+            ("throughput", len(values) / elapsed if elapsed else 0.0),
+            ("p50", percentile(values, 0.50)),
+            ("p95", percentile(values, 0.95)),
+            ("p99", percentile(values, 0.99)),
+            ("max", values[-1] if values else 0.0),
+            ("histogram", histogram),
+        ])
+        if self.statuses:
+            data["statuses"] = OrderedDict(sorted(self.statuses.items()))
+        if self.label:
+            data["step"] = self.label
+        return data
+
+
+class LoadStats(object):
+    """Thread-safe collection of all results of a load run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = {}
+        self.endpoints = {}
+        self.iterations = 0
+        self.scenarios = {"passed": 0, "failed": 0}
+        self.started = time.time()
+        self.finished = None
+
+    def add_step(self, location, step):
+        with self.lock:
+            series = self.steps.get(location)
+            if series is None:
+                series = self.steps[location] = Series(
+                    u"%s %s" % (step.keyword.strip(), step.name))
+            series.add(step.duration, step.status == Status.failed)
+
+    def add_request(self, timing):
+        name = timing.name
+        with self.lock:
+            series = self.endpoints.get(name)
+            if series is None:
+                series = self.endpoints[name] = Series()
+            if timing.status is None:
+                series.add(timing.total, True, "failed")
+            else:
+                series.add(timing.total, timing.status >= 400,
+                           "%dxx" % (timing.status // 100))
+
+    def add_iteration(self, features):
+        with self.lock:
+            self.iterations += 1
+            for feature in features:
+                for scenario in feature.walk_scenarios():
+                    if scenario.status.name in self.scenarios:
+                        self.scenarios[scenario.status.name] += 1
+
+    def make_report(self, users):
+        elapsed = (self.finished or time.time()) - self.started
+        with self.lock:
+            return OrderedDict([
+                ("users", users),
+                ("elapsed", elapsed),
+                ("iterations", self.iterations),
+                ("scenarios", dict(self.scenarios)),
+                ("steps", OrderedDict((location, self.steps[location].summary(elapsed))
+                                      for location in sorted(self.steps))),
+                ("endpoints", OrderedDict((name, self.endpoints[name].summary(elapsed))
+                                          for name in sorted(self.endpoints))),
+            ])
+
+
+class LoadRecorder(Formatter):
+    """Formatter that feeds step results of one virtual user into ``LoadStats``."""
+    name = "load"
+    description = "Collects step timings for the load mode."
+
+    def __init__(self, stats, config):
+        super(LoadRecorder, self).__init__(StreamOpener(stream=sys.stdout), config)
+        self.stats = stats
+        self.location = None
+
+    def match(self, match):
+        self.location = match.location and str(match.location)
+
+    def result(self, step):
+        if self.location and step.status in (Status.passed, Status.failed):
+            self.stats.add_step(self.location, step)
+        self.location = None
+
+
+class VirtualUser(threading.Thread):
+    """Runs the selected features repeatedly with its own runner and context."""
+
+    def __init__(self, index, command_args, stats, start_delay, deadline=None,
+                 iterations=None, stop_event=None):
+        super(VirtualUser, self).__init__(name="virtual-user-%d" % index)
+        self.daemon = True
+        self.command_args = command_args
+        self.stats = stats
+        self.start_delay = start_delay
+        self.deadline = deadline
+        self.iterations = iterations
+        self.stop_event = stop_event or threading.Event()
+        self.session = None
+        self.error = None
+
+    def setup(self):
+        runner, features = load_runner(self.command_args)
+        runner.formatters = [LoadRecorder(self.stats, runner.config)]
+        self.session = api_client.build_session()
+        return runner, features
+
+    def should_continue(self, done):
+        if self.stop_event.is_set():
+            return False
+        if self.iterations is not None and done >= self.iterations:
+            return False
+        return self.deadline is None or time.time() < self.deadline
+
+    def run(self):
+        if self.stop_event.wait(self.start_delay):
+            return
+        try:
+            runner, features = self.setup()
+            done = 0
+            while self.should_continue(done):
+                reset_model(features)
+                new_context(runner, self.session)
+                runner.run_model(features)
+                self.stats.add_iteration(features)
+                done += 1
+        except Exception as e:      # pylint: disable=broad-except
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if self.session is not None:
+                self.session.close()
+
+
+def write_table(report, stream=sys.stdout):
+    stream.write("\nLOAD: %d users, %.1fs, %d iterations (%.2f/s), "
+                 "scenarios: %d passed, %d failed\n" % (
+                     report["users"], report["elapsed"], report["iterations"],
+                     report["iterations"] / report["elapsed"] if report["elapsed"] else 0,
+                     report["scenarios"]["passed"], report["scenarios"]["failed"]))
+    header = "%8s %8s %8s %9s %9s %9s %9s  %s\n" % (
+        "count", "errors", "rate/s", "p50", "p95", "p99", "max", "name")
+    row = "%8d %8d %8.2f %8.3fs %8.3fs %8.3fs %8.3fs  %s\n"
+    for title, key in (("STEP DEFINITIONS", "steps"), ("ENDPOINTS", "endpoints")):
+        stream.write("\n%s:\n%s" % (title, header))
+        for name, stats in report[key].items():
+            label = name
+            if "step" in stats:
+                label = u"%s  %s" % (name, stats["step"])
+            stream.write(row % (stats["count"], stats["errors"],
+                                stats["throughput"], stats["p50"], stats["p95"],
+                                stats["p99"], stats["max"], label))
+            if stats.get("statuses"):
+                stream.write("%8s %s\n" % ("", ", ".join(
+                    "%s: %d" % item for item in stats["statuses"].items())))
+    stream.flush()
+
+
+def run_load(command_args, users=1, ramp_up=0.0, duration=None, iterations=None):
+    """Run the load test and return its report (see ``LoadStats.make_report``)."""
+    stats = LoadStats()
+    api_client.request_listeners.append(stats.add_request)
+    stop_event = threading.Event()
+    deadline = stats.started + duration if duration else None
+    virtual_users = [
+        VirtualUser(index, command_args, stats,
+                    start_delay=ramp_up * index / users,
+                    deadline=deadline, iterations=iterations,
+                    stop_event=stop_event)
+        for index in range(users)]
+    try:
+        for user in virtual_users:
+            user.start()
+        for user in virtual_users:
+            while user.is_alive():
+                user.join(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for user in virtual_users:
+            user.join()
+    finally:
+        api_client.request_listeners.remove(stats.add_request)
+        stats.finished = time.time()
+
+    errors = [user.error for user in virtual_users if user.error]
+    if errors:
+        raise errors[0]
+    return stats.make_report(users)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Replay API scenarios as concurrent virtual users.")
+    parser.add_argument("-u", "--users", type=int, default=1,
+                        help="Number of virtual users (default: %(default)s).")
+    parser.add_argument("--ramp-up", type=float, default=0.0, metavar="SECONDS",
+                        help="Time over which the users are started.")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument("--duration", type=float, metavar="SECONDS",
+                       help="Stop starting new iterations after this time.")
+    limit.add_argument("--iterations", type=int,
+                       help="Iterations per virtual user (default: 1).")
+    parser.add_argument("--stub", action="store_true",
+                        help="Run against the local in-memory book store.")
+    parser.add_argument("-t", "--tags", action="append", default=[],
+                        help="Tag expression to select scenarios (as in behave).")
+    parser.add_argument("-n", "--name", action="append", default=[],
+                        help="Select scenarios by name (as in behave).")
+    parser.add_argument("--report", help="Write the JSON report to this file.")
+    parser.add_argument("paths", nargs="*", default=["features"])
+    options = parser.parse_args(args)
+    if options.duration is None and options.iterations is None:
+        options.iterations = 1
+
+    server = None
+    if options.stub:
+        from bookstore_stub import start_server
+        server = start_server()
+        os.environ["BOOKSTORE_BASE_URL"] = server.base_url
+        print("Using book store stub at %s" % server.base_url)
+
+    command_args = ["--no-capture", "--no-capture-stderr", "--no-logcapture",
+                    "--no-summary", "--format=null"]
+    command_args += ["--tags=%s" % tags for tags in options.tags]
+    command_args += ["--name=%s" % name for name in options.name]
+    command_args += options.paths
+    try:
+        report = run_load(command_args, options.users, options.ramp_up,
+                          options.duration, options.iterations)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    write_table(report)
+    if options.report:
+        directory = os.path.dirname(options.report)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(options.report, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if report["scenarios"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Run the API suite on several workers and merge the results (``--jobs N``).
+
+behave runs features one after another, so a suite that mostly waits on HTTP
+round trips takes the sum of all its scenarios. This wrapper splits the
+selected features (or, with ``--scenarios``, single scenarios) into ``N``
+chunks balanced by past duration (see ``history.py``) and runs each chunk in
+its own worker::
+
+    python parallel.py --jobs 4 features
+    python parallel.py --jobs 4 --scenarios -t @smoke --junit reports/junit \\
+        --json reports/run.json features
+
+By default every worker is a ``python -m behave @chunk_i.txt -f ndjson``
+process with its own ``Context`` and its own ``before_all``/``after_all``.
+``--threads`` runs the workers as threads of this process instead, each with
+its own runner and API session; output capture is then turned off, as in
+load mode (see ``runners.py``). The worker event streams (see
+``events.py``) stay in ``--workdir``. The parent merges them in feature file
+order, prints a summary and writes the merged results as behave JSON and/or
+JUnit files. Step code needs no changes.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from behave.configuration import Configuration
+
+import api_client
+from events import read_events, to_json_data, write_junit
+from history import (DEFAULT_DATABASE, DurationHistory,
+                     collect_scenario_locations, make_estimator, split_shards,
+                     write_location_list)
+from runners import load_runner, new_context
+
+DEFAULT_WORKDIR = os.path.join("reports", "parallel")
+HERE = os.path.dirname(os.path.abspath(__file__))
+# -- Scoped name: Works without this directory's behave.ini.
+EVENT_FORMAT = "events:NDJsonFormatter"
+STATUSES = ("passed", "failed", "skipped", "untested")
+STEP_STATUSES = ("passed", "failed", "skipped", "undefined", "untested")
+
+
+def make_chunks(locations, stats, jobs, scenarios=False):
+    """Split the selected scenario ``locations`` into at most ``jobs`` chunks.
+
+    Without ``scenarios``, whole features are distributed. Returns lists of
+    locations (feature files or ``file:line``) in file order.
+    """
+    expected = make_estimator(locations, stats)
+    if scenarios:
+        units = OrderedDict((location, expected(location)) for location in locations)
+    else:
+        units = OrderedDict()
+        for location in locations:
+            filename = location.rsplit(":", 1)[0]
+            units[filename] = units.get(filename, 0.0) + expected(location)
+    shards, _ = split_shards(list(units), dict(
+        (unit, (duration, None)) for unit, duration in units.items()), jobs)
+    position = dict((unit, index) for index, unit in enumerate(units))
+    return [sorted(shard, key=position.get) for shard in shards if shard]
+
+
+class ThreadWorker(threading.Thread):
+    """Runs one chunk with its own behave runner and session in this process."""
+
+    def __init__(self, index, command_args):
+        super(ThreadWorker, self).__init__(name="behave-worker-%d" % index)
+        self.daemon = True
+        self.command_args = command_args
+        self.returncode = None
+        self.error = None
+
+    def run(self):
+        session = api_client.build_session()
+        try:
+            runner, features = load_runner(self.command_args)
+            new_context(runner, session)
+            failed = runner.run_model(features)
+            self.returncode = 1 if failed else 0
+        except Exception as e:      # pylint: disable=broad-except
+            self.error = e
+            self.returncode = 2
+        finally:
+            session.close()
+
+    def wait(self):
+        while self.is_alive():
+            self.join(0.5)
+        return self.returncode
+
+
+def worker_environment():
+    """Environment for worker processes: ``events`` must be importable."""
+    env = dict(os.environ)
+    paths = [HERE] + [path for path in env.get("PYTHONPATH", "").split(os.pathsep)
+                      if path]
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+def run_workers(chunk_files, stream_files, behave_args, threads=False):
+    """Run one behave worker per chunk; returns their exit codes."""
+    workers = []
+    for index, (chunk, stream) in enumerate(zip(chunk_files, stream_files)):
+        command_args = behave_args + ["--no-summary", "--format=%s" % EVENT_FORMAT,
+                                      "--outfile=%s" % stream, "@%s" % chunk]
+        if threads:
+            worker = ThreadWorker(index + 1, [
+                "--no-capture", "--no-capture-stderr", "--no-logcapture"] + command_args)
+            worker.start()
+        else:
+            worker = subprocess.Popen([sys.executable, "-m", "behave"] + command_args,
+                                      env=worker_environment())
+        workers.append(worker)
+    try:
+        return [worker.wait() for worker in workers]
+    except KeyboardInterrupt:
+        for worker in workers:
+            if not threads:
+                worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            if getattr(worker, "error", None) is not None:
+                sys.stderr.write("%s: %r\n" % (worker.name, worker.error))
+
+
+def count_statuses(features):
+    counts = dict((kind, dict.fromkeys(STEP_STATUSES, 0))
+                  for kind in ("features", "scenarios", "steps"))
+    for feature, scenarios in features.values():
+        counts["features"][feature["status"]] += 1
+        for scenario, steps in scenarios:
+            counts["scenarios"][scenario["status"]] += 1
+            for step in steps:
+                counts["steps"][step["status"]] += 1
+    return counts
+
+
+def has_failures(stream_file):
+    """Tell whether a worker's event stream reports a failed feature."""
+    if not os.path.exists(stream_file):
+        return False
+    with open(stream_file) as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                if event["event"] == "feature" and event["status"] == "failed":
+                    return True
+    return False
+
+
+def write_summary(features, elapsed, stream=sys.stdout):
+    """Print failing scenarios and counts like behave's summary reporter."""
+    failing = [scenario for _, scenarios in features.values()
+               for scenario, _ in scenarios if scenario["status"] == "failed"]
+    if failing:
+        stream.write("\nFailing scenarios:\n")
+        for scenario in failing:
+            stream.write(u"  %s  %s\n" % (scenario["location"], scenario["name"]))
+
+    counts = count_statuses(features)
+    stream.write("\n")
+    for kind, statuses in (("feature", STATUSES[:3]), ("scenario", STATUSES[:3]),
+                           ("step", STEP_STATUSES[:4])):
+        counter = counts[kind + "s"]
+        if counter["untested"]:
+            statuses += ("untested",)
+        first = counter[statuses[0]]
+        stream.write("%d %s%s %s, %s\n" % (
+            first, kind, "" if first == 1 else "s", statuses[0],
+            ", ".join("%d %s" % (counter[status], status)
+                      for status in statuses[1:])))
+    stream.write("Took %dm%.3fs\n" % divmod(elapsed, 60))
+    stream.flush()
+    return counts
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of workers (default: %(default)s).")
+    parser.add_argument("--scenarios", action="store_true",
+                        help="Distribute single scenarios instead of features.")
+    parser.add_argument("--threads", action="store_true",
+                        help="Run workers as threads instead of processes.")
+    parser.add_argument("-t", "--tags", action="append", default=[],
+                        help="Tag expression to select scenarios (as in behave).")
+    parser.add_argument("-n", "--name", action="append", default=[],
+                        help="Select scenarios by name (as in behave).")
+    parser.add_argument("-D", "--define", action="append", default=[],
+                        help="Userdata for the workers (as in behave).")
+    parser.add_argument("--lang", default=None, help="Gherkin language.")
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="History database used to balance the chunks.")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR,
+                        help="Chunk lists and worker event streams "
+                             "(default: %(default)s).")
+    parser.add_argument("--json", help="Write the merged run as behave JSON.")
+    parser.add_argument("--junit", metavar="DIRECTORY",
+                        help="Write the merged run as JUnit files.")
+    parser.add_argument("paths", nargs="*", default=["features"])
+    options = parser.parse_args(args)
+
+    behave_args = ["--tags=%s" % tags for tags in options.tags]
+    behave_args += ["--name=%s" % name for name in options.name]
+    behave_args += ["--define=%s" % value for value in options.define]
+    if options.lang:
+        behave_args.append("--lang=%s" % options.lang)
+
+    config = Configuration(command_args=behave_args, load_config=False)
+    locations = collect_scenario_locations(options.paths, options.lang, config)
+    if not locations:
+        sys.stderr.write("No scenarios selected.\n")
+        return 1
+    stats = {}
+    if os.path.exists(options.db):
+        history = DurationHistory(options.db)
+        try:
+            stats = history.stats()
+        finally:
+            history.close()
+    chunks = make_chunks(locations, stats, max(options.jobs, 1), options.scenarios)
+
+    if not os.path.isdir(options.workdir):
+        os.makedirs(options.workdir)
+    for pattern in ("chunk_*.txt", "worker_*.ndjson"):
+        # -- Leftovers of an earlier run (maybe with more jobs).
+        for filename in glob.glob(os.path.join(options.workdir, pattern)):
+            os.remove(filename)
+    chunk_files, stream_files = [], []
+    for index, chunk in enumerate(chunks):
+        chunk_file = os.path.join(options.workdir, "chunk_%d.txt" % (index + 1))
+        write_location_list(chunk_file, chunk)
+        chunk_files.append(chunk_file)
+        stream_files.append(os.path.join(options.workdir,
+                                         "worker_%d.ndjson" % (index + 1)))
+
+    started = time.time()
+    returncodes = run_workers(chunk_files, stream_files, behave_args,
+                              options.threads)
+    elapsed = time.time() - started
+
+    # -- Features come back in worker order: Restore the file order.
+    position = {}
+    for location in locations:
+        position.setdefault(os.path.abspath(location.rsplit(":", 1)[0]),
+                            len(position))
+    features = read_events([stream for stream in stream_files
+                            if os.path.exists(stream)])
+    features = OrderedDict(sorted(
+        features.items(),
+        key=lambda item: position.get(
+            os.path.abspath(item[0].rsplit(":", 1)[0]), len(position))))
+
+    counts = write_summary(features, elapsed, sys.stdout)
+    if options.json:
+        directory = os.path.dirname(options.json)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(options.json, "w") as f:
+            json.dump(to_json_data(features), f, indent=2)
+            f.write("\n")
+    if options.junit:
+        write_junit(features, options.junit)
+
+    crashed = [index + 1 for index, returncode in enumerate(returncodes)
+               if returncode and not has_failures(stream_files[index])]
+    if crashed:
+        sys.stderr.write("Workers failed without failing scenarios: %s\n"
+                         % ", ".join(str(index) for index in crashed))
+    failed = counts["features"]["failed"] or counts["scenarios"]["failed"]
+    return 1 if failed or crashed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
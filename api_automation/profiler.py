@@ -0,0 +1,308 @@
+"""Step and hook profiler for the API suite.
+
+``ProfileFormatter`` times every step with ``perf_counter`` and groups the
+timings by step definition (``match.location``). It reports count, total,
+p50, p95 and max per definition, plus the time spent in hooks, in
+capture/reporting around each step and in step matching. At the end of the
+run it prints a table and writes a JSON file that can be compared between
+runs::
+
+    behave -f profile -o reports/profile.txt -D profile_output=reports/profile.json
+    python profiler.py reports/baseline.json reports/profile.json
+
+Hooks are only timed if ``environment.py`` ends with::
+
+    from profiler import profile_hooks
+    profile_hooks(globals())
+
+This also times each step body with ``perf_counter`` between the
+``before_step`` and ``after_step`` hooks, and each ``find_match()`` call of
+the step registry. Without it, step bodies use behave's ``step.duration``
+(measured with ``time.time``), hook time is counted in the per-step
+"capture" overhead and step matching is not reported.
+"""
+
+import argparse
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from behave.formatter.base import Formatter
+
+HOOK_NAMES = ("before_all", "after_all", "before_feature", "after_feature",
+              "before_scenario", "after_scenario", "before_step", "after_step",
+              "before_tag", "after_tag")
+DEFAULT_OUTPUT = "profile.json"
+
+# -- The ProfileFormatter of the runner in this thread (set while it runs).
+#    Hooks run in the runner's thread, so several runners in one process
+#    (e.g. load mode) do not mix their timings.
+_active = threading.local()
+
+
+def active_profiler():
+    return getattr(_active, "profiler", None)
+
+
+def profile_hooks(namespace):
+    """Wrap the behave hooks defined in ``namespace`` with timers.
+
+    ``before_all``, ``before_step`` and ``after_step`` are added if missing:
+    ``before_all`` times the runner's step matching, the step hooks time the
+    step bodies with ``perf_counter``.
+    """
+    for name in HOOK_NAMES:
+        hook = namespace.get(name)
+        if getattr(hook, "_profiled", False):
+            continue
+        if callable(hook) or name in ("before_all", "before_step", "after_step"):
+            namespace[name] = _timed_hook(name, hook)
+
+
+def profile_matching(step_registry):
+    """Time ``step_registry.find_match()`` for the active ``ProfileFormatter``."""
+    find_match = step_registry.find_match
+    if getattr(find_match, "_profiled", False):
+        return
+
+    @functools.wraps(find_match)
+    def wrapper(step):
+        profiler = active_profiler()
+        if profiler is None:
+            return find_match(step)
+        start = time.perf_counter()
+        try:
+            return find_match(step)
+        finally:
+            profiler.add_matching(time.perf_counter() - start)
+    wrapper._profiled = True
+    step_registry.find_match = wrapper
+
+
+def _timed_hook(name, hook):
+    def wrapper(context, *args):
+        if name == "before_all":
+            # -- The runner's registry is known once the run has started.
+            profile_matching(context._runner.step_registry)
+        profiler = active_profiler()
+        if profiler is None:
+            return hook(context, *args) if hook else None
+        start = time.perf_counter()
+        try:
+            if hook:
+                return hook(context, *args)
+        finally:
+            profiler.add_hook(name, start, time.perf_counter(), hook is not None)
+    if hook:
+        wrapper = functools.wraps(hook)(wrapper)
+    wrapper.__name__ = name
+    wrapper._profiled = True
+    return wrapper
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of the already sorted ``values``."""
+    if not values:
+        return 0.0
+    rank = int(math.ceil(fraction * len(values))) - 1
+    return values[max(rank, 0)]
+
+
+def summarize(durations):
+    values = sorted(durations)
+    return OrderedDict([
+        ("count", len(values)),
+        ("total", sum(values)),
+        ("p50", percentile(values, 0.50)),
+        ("p95", percentile(values, 0.95)),
+        ("max", values[-1] if values else 0.0),
+    ])
+
+
+class ProfileFormatter(Formatter):
+    """Aggregates step timings by step definition and reports percentiles."""
+    name = "profile"
+    description = "Profiles steps/hooks and reports latency percentiles."
+
+    def __init__(self, stream_opener, config):
+        super(ProfileFormatter, self).__init__(stream_opener, config)
+        self.output_path = config.userdata.get("profile_output", DEFAULT_OUTPUT)
+        self.steps = OrderedDict()
+        self.endpoints = {}
+        self.hooks = {}
+        self.matching = []
+        self.capture = []
+        self._last_mark = None
+        self._match_start = None
+        self._location = None
+        self._step_hooks = 0.0
+        self._matching = 0.0
+        self._body_start = None
+        self._body_end = None
+        _active.profiler = self
+
+    def add_matching(self, elapsed):
+        """Called by the ``profile_matching`` wrapper of ``find_match()``."""
+        self.matching.append(elapsed)
+        self._matching += elapsed
+
+    def add_hook(self, name, start, end, recorded=True):
+        """Called by the ``profile_hooks`` wrappers around every hook call."""
+        if recorded:
+            self.hooks.setdefault(name, []).append(end - start)
+        if name == "before_step":
+            self._step_hooks += end - start
+            self._body_start = end
+        elif name == "after_step":
+            self._step_hooks += end - start
+            self._body_end = start
+
+    def scenario(self, scenario):
+        self._last_mark = time.perf_counter()
+        self._matching = 0.0
+
+    def match(self, match):
+        now = time.perf_counter()
+        if self._last_mark is not None:
+            # -- Since scenario() or the previous result(): capture setup,
+            #    the other formatters and find_match(), which is timed
+            #    separately.
+            self.capture.append(max(now - self._last_mark - self._matching, 0.0))
+        self._location = match.location and str(match.location)
+        self._match_start = now
+        self._step_hooks = 0.0
+        self._matching = 0.0
+        self._body_start = self._body_end = None
+
+    def result(self, step):
+        now = time.perf_counter()
+        self._last_mark = now
+        if self._match_start is None or self._location is None:
+            # -- Skipped or undefined step: nothing ran.
+            return
+
+        wall = now - self._match_start
+        if self._body_start is not None and self._body_end is not None:
+            body = self._body_end - self._body_start
+        else:
+            body = step.duration
+        self.capture.append(max(wall - body - self._step_hooks, 0.0))
+        entry = self.steps.get(self._location)
+        if entry is None:
+            entry = self.steps[self._location] = {
+                "step": u"%s %s" % (step.keyword.strip(), step.name),
+                "durations": [],
+            }
+        entry["durations"].append(body)
+        for timing in getattr(step, "api_timings", None) or []:
+            # -- Set by api_client.attach_step_timings() in after_step.
+            self.endpoints.setdefault(timing.name, []).append(timing.total)
+        self._match_start = None
+        self._location = None
+
+    def close(self):
+        if active_profiler() is self:
+            _active.profiler = None
+        report = self.make_report()
+        self.write_table(report)
+        self.write_json(report)
+        self.close_stream()
+
+    # -- Reporting ------------------------------------------------------------
+    def make_report(self):
+        steps = OrderedDict()
+        for location in sorted(self.steps):
+            entry = self.steps[location]
+            stats = summarize(entry["durations"])
+            stats["step"] = entry["step"]
+            steps[location] = stats
+        hooks = OrderedDict((name, summarize(self.hooks[name]))
+                            for name in HOOK_NAMES if name in self.hooks)
+        endpoints = OrderedDict((name, summarize(self.endpoints[name]))
+                                for name in sorted(self.endpoints))
+        overhead = OrderedDict([("matching", summarize(self.matching)),
+                                ("capture", summarize(self.capture))])
+        return OrderedDict([("steps", steps), ("endpoints", endpoints),
+                            ("hooks", hooks), ("overhead", overhead)])
+
+    def write_table(self, report):
+        stream = self.open()
+        header = u"%8s %10s %9s %9s %9s  %s\n" % (
+            "count", "total", "p50", "p95", "max", "location / name")
+        row = u"%8d %9.3fs %8.3fs %8.3fs %8.3fs  %s\n"
+
+        stream.write(u"\nSTEP DEFINITIONS (by total time):\n" + header)
+        by_total = sorted(report["steps"].items(),
+                          key=lambda item: item[1]["total"], reverse=True)
+        for location, stats in by_total:
+            stream.write(row % (stats["count"], stats["total"], stats["p50"],
+                                stats["p95"], stats["max"],
+                                u"%s  %s" % (location, stats["step"])))
+
+        if report["endpoints"]:
+            stream.write(u"\nHTTP ENDPOINTS (by total time):\n" + header)
+            by_total = sorted(report["endpoints"].items(),
+                              key=lambda item: item[1]["total"], reverse=True)
+            for name, stats in by_total:
+                stream.write(row % (stats["count"], stats["total"], stats["p50"],
+                                    stats["p95"], stats["max"], name))
+
+        stream.write(u"\nHOOKS AND OVERHEAD:\n" + header)
+        others = list(report["hooks"].items()) + list(report["overhead"].items())
+        for name, stats in others:
+            stream.write(row % (stats["count"], stats["total"], stats["p50"],
+                                stats["p95"], stats["max"], name))
+        stream.flush()
+
+    def write_json(self, report):
+        directory = os.path.dirname(self.output_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.output_path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+# -----------------------------------------------------------------------------
+# COMPARE TWO PROFILES
+# -----------------------------------------------------------------------------
+def compare(baseline, current, threshold=1.2, min_seconds=0.01):
+    """Return ``(location, old_p95, new_p95)`` of step definitions whose p95
+    grew by more than ``threshold`` (a ratio), ignoring tiny timings.
+    """
+    regressions = []
+    for location, stats in current["steps"].items():
+        old = baseline["steps"].get(location)
+        if old is None or stats["p95"] < min_seconds:
+            continue
+        if stats["p95"] > old["p95"] * threshold:
+            regressions.append((location, old["p95"], stats["p95"]))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two profile.json files and list slower steps.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p95 ratio that counts as regression (default: 1.2)")
+    options = parser.parse_args(args)
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    with open(options.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, options.threshold)
+    for location, old, new in regressions:
+        print("%s: p95 %.3fs -> %.3fs" % (location, old, new))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
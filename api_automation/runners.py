@@ -0,0 +1,50 @@
+"""Several behave runners in one process, one per worker thread.
+
+Load mode (``load.py``) and ``parallel.py --threads`` give every thread its
+own ``Runner`` and ``Context``. Loading hooks and step definitions changes
+``sys.path`` and behave's shared step registry, so it happens under one lock.
+Each thread should also get its own ``requests.Session``: ``new_context``
+stores it as ``context.api_session``, which the ``api_client`` fixture uses
+instead of the per-process session.
+
+Output capture must be turned off (``--no-capture``, ``--no-capture-stderr``,
+``--no-logcapture``), because behave swaps ``sys.stdout`` for the whole
+process.
+"""
+
+import threading
+
+from behave.configuration import Configuration
+from behave.formatter._registry import make_formatters
+from behave.runner import Context, Runner
+
+from feature_cache import parse_features
+
+setup_lock = threading.Lock()
+
+
+def load_runner(command_args):
+    """Return ``(runner, features)`` for behave's ``command_args``.
+
+    The runner has its hooks, step definitions and the formatters of its
+    configuration loaded; ``features`` are the parsed feature files.
+    """
+    config = Configuration(command_args=command_args)
+    runner = Runner(config)
+    with setup_lock, runner.path_manager:
+        runner.setup_paths()
+        runner.load_hooks()
+        runner.load_step_definitions()
+        locations = [filename for filename in runner.feature_locations()
+                     if not config.exclude(filename)]
+        features = parse_features(locations, language=config.lang)
+    runner.formatters = make_formatters(config, config.outputs)
+    return runner, features
+
+
+def new_context(runner, session=None):
+    """Give ``runner`` a fresh ``Context`` that uses ``session`` for API calls."""
+    runner.context = Context(runner)
+    if session is not None:
+        runner.context.api_session = session
+    return runner.context
@@ -0,0 +1,112 @@
+import socket
+import threading
+
+import pytest
+import requests
+
+import api_client
+from api_client import ApiClient, build_session, endpoint_name
+from bookstore_stub import start_server
+
+
+@pytest.fixture
+def server():
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = ApiClient(server.base_url, session=build_session())
+    yield client
+    client.session.close()
+    api_client.clear_token_cache()
+
+
+def test_endpoint_name_replaces_ids():
+    assert endpoint_name("DELETE", "/Account/v1/User/0c9a4b1e-5f0a-4c53-9d7e-1f5b7e4c2a11") \
+        == "DELETE /Account/v1/User/{id}"
+    assert endpoint_name("GET", "/BookStore/v1/Books") == "GET /BookStore/v1/Books"
+
+
+def test_base_url_defaults_to_environment(monkeypatch):
+    monkeypatch.setenv("BOOKSTORE_BASE_URL", "http://localhost:1234/")
+    assert ApiClient(session=build_session()).base_url == "http://localhost:1234"
+
+
+def test_connection_is_reused(client):
+    client.list_books()
+    client.list_books()
+    first, second = client.pop_timings()
+    assert first.new_connection
+    assert not second.new_connection
+    assert first.status == 200 and first.total >= first.ttfb > 0
+
+
+def test_new_connection_is_tracked_per_thread(server):
+    session = build_session(pool_maxsize=4)
+    ApiClient(server.base_url, session=session).list_books()    # warm one socket
+    barrier = threading.Barrier(4)
+    timings = []
+
+    def worker():
+        client = ApiClient(server.base_url, session=session)
+        barrier.wait()
+        client.list_books()
+        timings.extend(client.pop_timings())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # -- At most one request can reuse the warm socket; the flags must add
+    #    up to the sockets actually opened, not be smeared across threads.
+    pools = session.get_adapter(server.base_url).poolmanager.pools
+    new_sockets = sum(pools[key].num_connections for key in pools.keys())
+    assert sum(timing.new_connection for timing in timings) == new_sockets - 1
+    session.close()
+
+
+def test_get_token_is_cached(client):
+    client.create_user("cached", "Passw0rd!")
+    token = client.get_token("cached", "Passw0rd!")
+    assert client.get_token("cached", "Passw0rd!") == token
+    logins = [timing for timing in client.pop_timings()
+              if timing.endpoint == "/Account/v1/GenerateToken"]
+    assert len(logins) == 1
+
+
+def test_listeners_see_every_request(client):
+    seen = []
+    api_client.request_listeners.append(seen.append)
+    try:
+        client.list_books()
+    finally:
+        api_client.request_listeners.remove(seen.append)
+    assert [timing.name for timing in seen] == ["GET /BookStore/v1/Books"]
+
+
+def test_failed_request_is_recorded_and_raised():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    client = ApiClient("http://127.0.0.1:%d" % port,
+                       session=build_session(retries=0))
+    seen = []
+    api_client.request_listeners.append(seen.append)
+    try:
+        with pytest.raises(requests.ConnectionError):
+            client.list_books()
+    finally:
+        api_client.request_listeners.remove(seen.append)
+        client.session.close()
+
+    timing, = client.pop_timings()
+    assert seen == [timing]
+    assert timing.status is None and timing.ttfb is None
+    assert timing.to_dict()["error"] == "ConnectionError"
+    assert "ConnectionError" in repr(timing)
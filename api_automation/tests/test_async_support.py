@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from behave.configuration import Configuration
+from behave.fixture import use_fixture
+from behave.runner import Context
+
+from async_support import async_fixture, async_step, event_loop, run_concurrently
+
+
+class FakeRunner(object):
+    def __init__(self):
+        self.config = Configuration(command_args=[], load_config=False)
+
+
+@pytest.fixture
+def context():
+    context = Context(FakeRunner())
+    context._push(layer_name="scenario")
+    return context
+
+
+def test_async_generator_fixture_creates_loop_and_cleans_up(context):
+    calls = []
+
+    @async_fixture
+    async def resource(context, value):
+        calls.append("setup")
+        yield value * 2
+        calls.append("cleanup")
+
+    assert use_fixture(resource, context, 4) == 8
+    loop = context.event_loop
+    context._pop()
+    # -- The fixture's cleanup ran on the loop, then the loop was closed.
+    assert calls == ["setup", "cleanup"]
+    assert loop.is_closed()
+
+
+def test_async_generator_fixture_uses_existing_loop(context):
+    loop = use_fixture(event_loop, context)
+    calls = []
+
+    @async_fixture
+    async def resource(context):
+        yield
+        calls.append("cleanup")
+
+    use_fixture(resource, context)
+    context._pop()
+    assert calls == ["cleanup"]
+    assert loop.is_closed()
+
+
+def test_async_step_runs_on_shared_loop(context):
+    loop = use_fixture(event_loop, context)
+    seen = []
+
+    @async_step
+    async def step(context, value):
+        seen.append(asyncio.get_running_loop())
+        return value
+
+    assert step(context, 3) == 3
+    assert seen == [loop]
+
+
+def test_nested_async_step_fails_clearly(context):
+    @async_step
+    async def inner(context):
+        return "inner"
+
+    @async_step
+    async def outer(context):
+        return inner(context)
+
+    with pytest.raises(RuntimeError, match="already running: .*inner"):
+        outer(context)
+    # -- The loop is still usable afterwards.
+    assert inner(context) == "inner"
+
+
+def test_fan_out_runs_up_to_concurrency_calls_at_once(context):
+    # -- Every call waits until all 30 are in flight.
+    barrier = threading.Barrier(30, timeout=5)
+
+    def slow(value):
+        barrier.wait()
+        time.sleep(0.1)
+        return value
+
+    start = time.perf_counter()
+    results = run_concurrently(context, slow, list(range(30)), concurrency=50)
+    elapsed = time.perf_counter() - start
+    assert results == list(range(30))
+    # -- One after another would take 3s.
+    assert elapsed < 1.5
+
+
+def test_fan_out_raises_first_failure(context):
+    def fail(value):
+        if value == 2:
+            raise ValueError(value)
+        return value
+
+    with pytest.raises(ValueError):
+        run_concurrently(context, fail, [1, 2, 3])
+
+
+def test_fan_out_warns_when_pool_is_smaller(context):
+    class Client(object):
+        pool_maxsize = 10
+
+        def call(self, value):
+            return value
+
+    with pytest.warns(UserWarning, match="pool_maxsize=10"):
+        assert run_concurrently(context, Client().call, [1, 2], concurrency=50) == [1, 2]
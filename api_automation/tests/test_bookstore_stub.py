@@ -0,0 +1,81 @@
+import pytest
+
+import api_client
+from api_client import ApiClient, build_session
+from bookstore_stub import BOOKS, start_server
+
+PASSWORD = "Secret1!"
+GIT_POCKET_GUIDE = "9781449325862"
+SPEAKING_JAVASCRIPT = "9781449365035"
+
+
+@pytest.fixture
+def client():
+    server = start_server()
+    client = ApiClient(server.base_url, session=build_session())
+    yield client
+    client.session.close()
+    api_client.clear_token_cache()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def user(client):
+    response = client.create_user("alice", PASSWORD)
+    assert response.status_code == 201
+    user_id = response.json()["userID"]
+    return user_id, client.get_token("alice", PASSWORD)
+
+
+def test_create_user_validates_input(client):
+    assert client.create_user("bob", "weak").json()["code"] == "1300"
+    assert client.create_user("bob", PASSWORD).status_code == 201
+    assert client.create_user("bob", PASSWORD).status_code == 406
+    assert client.request("POST", "/Account/v1/User", json={}).status_code == 400
+
+
+def test_login_and_authorized(client, user):
+    assert client.authorized("alice", PASSWORD).json() is True
+    assert client.authorized("alice", "Wrong1!x").json() is False
+    assert client.authorized("nobody", PASSWORD).status_code == 404
+    failed = client.generate_token("alice", "Wrong1!x").json()
+    assert failed["token"] is None and failed["status"] == "Failed"
+
+
+def test_books_catalog(client):
+    books = client.list_books().json()["books"]
+    assert len(books) == len(BOOKS)
+    assert client.get_book(GIT_POCKET_GUIDE).json()["title"] == "Git Pocket Guide"
+    assert client.get_book("0000000000000").status_code == 400
+
+
+def test_user_collection(client, user):
+    user_id, token = user
+    assert client.add_books(user_id, [GIT_POCKET_GUIDE, SPEAKING_JAVASCRIPT],
+                            token).status_code == 201
+    assert client.add_books(user_id, [GIT_POCKET_GUIDE], token).json()["code"] == "1210"
+    assert client.add_books(user_id, ["0000000000000"], token).json()["code"] == "1205"
+    books = client.get_user(user_id, token).json()["books"]
+    assert [book["isbn"] for book in books] == [GIT_POCKET_GUIDE, SPEAKING_JAVASCRIPT]
+
+    assert client.delete_book(user_id, GIT_POCKET_GUIDE, token).status_code == 204
+    assert client.delete_book(user_id, GIT_POCKET_GUIDE, token).status_code == 400
+    assert client.delete_books(user_id, token).status_code == 204
+    assert client.get_user(user_id, token).json()["books"] == []
+
+
+def test_requests_need_the_users_token(client, user):
+    user_id, token = user
+    client.create_user("mallory", PASSWORD)
+    other_token = client.get_token("mallory", PASSWORD)
+    assert client.get_user(user_id, None).status_code == 401
+    assert client.get_user(user_id, other_token).status_code == 401
+    assert client.add_books(user_id, [GIT_POCKET_GUIDE], other_token).status_code == 401
+
+
+def test_delete_user_revokes_tokens(client, user):
+    user_id, token = user
+    assert client.delete_user(user_id, token).status_code == 204
+    assert client.get_user(user_id, token).status_code == 401
+    assert client.request("GET", "/Unknown").status_code == 404
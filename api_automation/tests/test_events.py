@@ -0,0 +1,111 @@
+import json
+
+from events import make_testcase, merge_feature, read_events
+
+
+def step_event(name, status="passed", **extra):
+    event = {"event": "step", "keyword": "Given", "step_type": "given",
+             "name": name, "location": "a.feature:3", "status": status,
+             "duration": 0.1}
+    event.update(extra)
+    return event
+
+
+def scenario_event(line, status, duration=0.1, name=None):
+    return {"event": "scenario", "feature": "a.feature:1", "keyword": "Scenario",
+            "name": name or "scenario %d" % line, "tags": [],
+            "location": "a.feature:%d" % line, "status": status,
+            "duration": duration}
+
+
+def feature_event(status, duration=0.2):
+    return {"event": "feature", "keyword": "Feature", "name": "A", "tags": [],
+            "location": "a.feature:1", "classname": "a", "status": status,
+            "duration": duration}
+
+
+def write_stream(path, scenarios, feature):
+    with open(str(path), "w") as f:
+        for scenario in scenarios:
+            f.write(json.dumps(step_event(scenario["name"], scenario["status"])) + "\n")
+            f.write(json.dumps(scenario) + "\n")
+        f.write(json.dumps(feature) + "\n")
+    return str(path)
+
+
+def statuses(features):
+    return [(scenario["location"], scenario["status"])
+            for _, scenarios in features.values() for scenario, _ in scenarios]
+
+
+def test_read_events_groups_steps_by_scenario(tmp_path):
+    stream = write_stream(tmp_path / "run.ndjson",
+                          [scenario_event(3, "passed"), scenario_event(7, "failed")],
+                          feature_event("failed"))
+    features = read_events([stream])
+    feature, scenarios = features["a.feature:1"]
+    assert feature["status"] == "failed"
+    assert [steps[0]["name"] for _, steps in scenarios] == ["scenario 3", "scenario 7"]
+
+
+def test_read_events_merges_shards_by_scenario(tmp_path):
+    shard1 = write_stream(tmp_path / "1.ndjson",
+                          [scenario_event(3, "passed"), scenario_event(7, "skipped")],
+                          feature_event("passed"))
+    shard2 = write_stream(tmp_path / "2.ndjson",
+                          [scenario_event(3, "skipped"), scenario_event(7, "failed")],
+                          feature_event("failed"))
+    features = read_events([shard1, shard2])
+    assert statuses(features) == [("a.feature:3", "passed"), ("a.feature:7", "failed")]
+    feature, scenarios = features["a.feature:1"]
+    assert feature["status"] == "failed"
+    assert scenarios[1][1][0]["status"] == "failed"
+    assert abs(feature["duration"] - 0.2) < 1e-9
+
+
+def test_merge_feature_later_run_wins():
+    features = {}
+    merge_feature(features, feature_event("failed"),
+                  [(scenario_event(3, "failed"), [])])
+    merge_feature(features, feature_event("passed"),
+                  [(scenario_event(3, "passed", duration=0.5), [])])
+    assert statuses(features) == [("a.feature:3", "passed")]
+    assert features["a.feature:1"][0]["status"] == "passed"
+    assert features["a.feature:1"][0]["duration"] == 0.5
+
+
+def test_merge_feature_keeps_feature_hook_failure():
+    features = {}
+    failed = feature_event("failed")
+    failed["hook_failed"] = True
+    merge_feature(features, failed, [(scenario_event(3, "skipped"), [])])
+    merge_feature(features, feature_event("passed"),
+                  [(scenario_event(3, "passed"), [])])
+    assert features["a.feature:1"][0]["status"] == "failed"
+
+
+def test_make_testcase_reports_failures_and_errors():
+    case, counter = make_testcase("a.A", scenario_event(3, "failed"), [
+        step_event("ok"),
+        step_event("boom", "failed", exception_type="AssertionError",
+                   exception_message="expected 200", error_message="Traceback")])
+    assert counter == "failures"
+    assert case.find("failure").get("message") == "expected 200"
+    assert "boom" in case.find("failure").text
+
+    case, counter = make_testcase("a.A", scenario_event(3, "failed"), [
+        step_event("boom", "failed", exception_type="ConnectionError")])
+    assert counter == "errors"
+    assert case.find("error").get("type") == "ConnectionError"
+
+
+def test_make_testcase_skipped_and_undefined():
+    case, counter = make_testcase("a.A", scenario_event(3, "skipped"),
+                                  [step_event("later", "skipped")])
+    assert counter == "skipped"
+    assert case.find("skipped") is not None
+
+    case, counter = make_testcase("a.A", scenario_event(3, "untested"),
+                                  [step_event("missing", "undefined")])
+    assert counter == "failures"
+    assert case.find("failure").get("type") == "undefined"
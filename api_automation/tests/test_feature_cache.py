@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from behave import parser
+from behave.model_core import FileLocation
+
+import feature_cache
+from feature_cache import parse_features, parse_file
+
+FEATURE = u"""\
+@books
+Feature: Books
+  Scenario: list
+    Given the catalog
+
+  @slow
+  Scenario Outline: add <count>
+    Given <count> books
+    Examples:
+      | count |
+      | 1     |
+      | 2     |
+"""
+
+
+def describe(feature):
+    return [(str(scenario.location), scenario.name,
+             sorted(str(tag) for tag in scenario.effective_tags))
+            for scenario in feature.walk_scenarios()]
+
+
+@pytest.fixture
+def feature_file(tmp_path):
+    path = tmp_path / "books.feature"
+    path.write_text(FEATURE)
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def forbid_parsing(monkeypatch):
+    def parse_feature(*args, **kwargs):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(parser, "parse_feature", parse_feature)
+
+
+def test_cached_feature_matches_behave(feature_file, cache_dir, monkeypatch):
+    expected = describe(parser.parse_file(feature_file))
+    assert describe(parse_file(feature_file, directory=cache_dir)) == expected
+
+    forbid_parsing(monkeypatch)
+    cached = parse_file(feature_file, directory=cache_dir)
+    assert describe(cached) == expected
+    assert cached is not parse_file(feature_file, directory=cache_dir)
+
+
+def test_changed_file_is_parsed_again(feature_file, cache_dir):
+    parse_file(feature_file, directory=cache_dir)
+    with open(feature_file, "a") as f:
+        f.write(u"\n  Scenario: new\n    Given the catalog\n")
+    names = [scenario.name for scenario in
+             parse_file(feature_file, directory=cache_dir).walk_scenarios()]
+    assert names[-1] == "new"
+
+
+def test_touched_file_with_same_content_is_reused(feature_file, cache_dir, monkeypatch):
+    parse_file(feature_file, directory=cache_dir)
+    stat = os.stat(feature_file)
+    os.utime(feature_file, (stat.st_atime, stat.st_mtime + 10))
+    forbid_parsing(monkeypatch)
+    assert parse_file(feature_file, directory=cache_dir).name == "Books"
+
+
+def test_language_and_behave_version_are_part_of_the_key(feature_file, cache_dir,
+                                                         monkeypatch):
+    entry = feature_cache.cache_filename(feature_file, None, cache_dir)
+    assert feature_cache.cache_filename(feature_file, "de", cache_dir) != entry
+    monkeypatch.setattr(feature_cache.behave, "__version__", "9.9.9")
+    assert feature_cache.cache_filename(feature_file, None, cache_dir) != entry
+
+
+def test_parse_features_selects_scenarios_by_line(feature_file, cache_dir):
+    features = parse_features([FileLocation(feature_file, 3),
+                               FileLocation(feature_file, 12)], directory=cache_dir)
+    assert len(features) == 1
+    selected = [scenario.name for scenario in features[0].walk_scenarios()
+                if scenario.should_run()]
+    assert selected == ["list", "add 2 -- @1.2 "]
+
+
+def test_empty_directory_disables_the_cache(feature_file, cache_dir):
+    assert parse_file(feature_file, directory="").name == "Books"
+    assert not os.path.exists(cache_dir)
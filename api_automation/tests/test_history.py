@@ -0,0 +1,113 @@
+import argparse
+
+import pytest
+from behave.configuration import Configuration
+
+from history import (EMPTY_SHARD, HISTORY_SIZE, DurationHistory,
+                     collect_scenario_locations, main, order_locations,
+                     parse_shard, split_shards)
+
+FEATURE = u"""\
+Feature: Books
+  @load
+  Scenario: one
+    Given a step
+
+  Scenario: two
+    Given a step
+"""
+
+
+def test_split_shards_balances_known_durations():
+    stats = {"a:1": (4.0, "passed"), "a:2": (3.0, "passed"),
+             "b:1": (2.0, "passed"), "b:2": (2.0, "passed"),
+             "c:1": (1.0, "passed")}
+    shards, loads = split_shards(sorted(stats), stats, 2)
+    assert sorted(loads) == [6.0, 6.0]
+    assert sorted(sum(shards, [])) == sorted(stats)
+
+
+def test_split_shards_uses_median_for_unknown_scenarios():
+    stats = {"a:1": (1.0, "passed"), "a:2": (2.0, "passed"),
+             "a:3": (9.0, "passed")}
+    shards, loads = split_shards(["a:1", "a:2", "a:3", "new:1"], stats, 1)
+    assert loads == [14.0]
+
+
+def test_order_failed_first_moves_whole_features():
+    locations = ["a:1", "a:2", "b:1", "c:1"]
+    stats = {"b:1": (1.0, "passed"), "c:1": (1.0, "failed")}
+    assert order_locations(["a:2", "a:1", "b:1", "c:1"], stats, "failed-first",
+                           file_order=locations) == ["c:1", "a:1", "a:2", "b:1"]
+    assert order_locations(["c:1", "a:1"], stats, "file",
+                           file_order=locations) == ["a:1", "c:1"]
+
+
+def test_order_slowest_first_uses_median_for_unknown_scenarios():
+    # -- Median of all known durations is 2.0: "b" (unknown) beats "a" (1.5).
+    locations = ["a:1", "b:1", "c:1", "d:1"]
+    stats = {"a:1": (1.5, "passed"), "c:1": (2.0, "passed"),
+             "d:1": (3.0, "passed")}
+    assert order_locations(["a:1", "b:1"], stats, "slowest-first",
+                           file_order=locations) == ["b:1", "a:1"]
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for text in ("0/4", "5/4", "x/4", "2"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(text)
+
+
+def test_collect_scenario_locations_filters_by_tags_and_name(tmp_path, monkeypatch):
+    (tmp_path / "books.feature").write_text(FEATURE)
+    monkeypatch.chdir(tmp_path)
+    filename = "books.feature"
+    assert collect_scenario_locations([filename]) == [
+        filename + ":3", filename + ":6"]
+
+    config = Configuration(command_args=["--tags=@load"], load_config=False)
+    assert collect_scenario_locations([filename], config=config) == [filename + ":3"]
+    config = Configuration(command_args=["--name=two"], load_config=False)
+    assert collect_scenario_locations([filename], config=config) == [filename + ":6"]
+
+
+def test_history_keeps_recent_mean_and_last_status(tmp_path):
+    history = DurationHistory(str(tmp_path / "history.sqlite"))
+    try:
+        for run in range(7):
+            history.record([("a:1", "failed" if run == 6 else "passed", float(run))],
+                           recorded_at=run + 1)
+        assert history.stats() == {"a:1": (4.0, "failed")}
+    finally:
+        history.close()
+
+
+def test_history_deletes_results_beyond_history_size(tmp_path):
+    history = DurationHistory(str(tmp_path / "history.sqlite"))
+    try:
+        for run in range(HISTORY_SIZE + 3):
+            history.record([("a:1", "passed", float(run)), ("b:1", "passed", 1.0)],
+                           recorded_at=run + 1)
+        rows = history.connection.execute(
+            "SELECT location, COUNT(*), MIN(duration) FROM results"
+            " GROUP BY location").fetchall()
+        assert rows == [("a:1", HISTORY_SIZE, 3.0), ("b:1", HISTORY_SIZE, 1.0)]
+    finally:
+        history.close()
+
+
+def test_select_empty_shard_writes_no_list(tmp_path, monkeypatch, capsys):
+    (tmp_path / "books.feature").write_text(FEATURE)
+    monkeypatch.chdir(tmp_path)
+    output = tmp_path / "shard.txt"
+
+    def select(*args):
+        return main(["--db", str(tmp_path / "history.sqlite"), "select",
+                     "-o", str(output)] + list(args) + ["books.feature"])
+
+    assert select("--shard", "2/2") == 0
+    assert output.read_text() == u"books.feature:6\n"
+    assert select("--shard", "3/3", "-t", "@load") == EMPTY_SHARD
+    assert not output.exists()
+    assert "no scenarios" in capsys.readouterr().err
@@ -0,0 +1,47 @@
+from api_client import RequestTiming
+from load import HISTOGRAM_BOUNDS, LoadStats, Series
+
+
+def test_series_summary():
+    series = Series("Given a step")
+    for index in range(1, 101):
+        series.add(index / 1000.0, error=index > 98)
+    summary = series.summary(elapsed=2.0)
+
+    assert summary["count"] == 100
+    assert summary["errors"] == 2
+    assert summary["throughput"] == 50.0
+    assert summary["p50"] == 0.05
+    assert summary["p95"] == 0.095
+    assert summary["p99"] == 0.099
+    assert summary["max"] == 0.1
+    assert summary["step"] == "Given a step"
+    assert summary["histogram"]["<=0.005s"] == 5
+    assert summary["histogram"]["<=0.01s"] == 5
+    assert summary["histogram"]["<=0.1s"] == 50
+    assert sum(summary["histogram"].values()) == 100
+    assert "statuses" not in summary
+
+
+def test_series_summary_without_values():
+    summary = Series().summary(elapsed=0)
+    assert summary["count"] == 0
+    assert summary["throughput"] == 0.0
+    assert summary["p95"] == 0.0
+    assert summary["histogram"][">%gs" % HISTOGRAM_BOUNDS[-1]] == 0
+
+
+def test_requests_are_grouped_by_endpoint_with_client_errors():
+    stats = LoadStats()
+    for status in (200, 201, 404, 503):
+        stats.add_request(RequestTiming("GET", "/Account/v1/User/%d" % status,
+                                        status, 0.01, 0.02, False))
+    stats.add_request(RequestTiming("GET", "/Account/v1/User/1", None, None,
+                                    0.5, True, error="ConnectionError"))
+    endpoints = stats.make_report(users=1)["endpoints"]
+
+    assert list(endpoints) == ["GET /Account/v1/User/{id}"]
+    summary = endpoints["GET /Account/v1/User/{id}"]
+    assert summary["count"] == 5
+    assert summary["errors"] == 3
+    assert summary["statuses"] == {"2xx": 2, "4xx": 1, "5xx": 1, "failed": 1}
@@ -0,0 +1,114 @@
+import json
+import os
+from xml.etree import ElementTree
+
+import pytest
+
+import parallel
+from parallel import make_chunks
+
+ENVIRONMENT = u"""\
+from behave.fixture import use_fixture
+from api_client import api_client
+
+def before_all(context):
+    use_fixture(api_client, context)
+"""
+
+STEPS = u"""\
+import time
+from behave import given, then
+
+def record_session(context):
+    with open("sessions.txt", "a") as f:
+        f.write("%d\\n" % id(context.api_client.session))
+
+@given("the worker waits {seconds:f}")
+def step_wait(context, seconds):
+    record_session(context)
+    time.sleep(seconds)
+
+@then("it fails")
+def step_fail(context):
+    record_session(context)
+    assert False, "expected failure"
+"""
+
+
+def scenario(index, tag=None):
+    text = u"  Scenario: s%d\n    Given the worker waits 0.2\n" % index
+    return u"  %s\n%s" % (tag, text) if tag else text
+
+
+def test_make_chunks_keeps_features_together():
+    locations = ["a.feature:2", "a.feature:5", "b.feature:2", "c.feature:2"]
+    stats = {"a.feature:2": (3.0, "passed"), "a.feature:5": (1.0, "passed"),
+             "b.feature:2": (2.0, "passed"), "c.feature:2": (2.0, "passed")}
+    chunks = make_chunks(locations, stats, 2)
+    assert sorted(chunks) == [["a.feature"], ["b.feature", "c.feature"]]
+
+
+def test_make_chunks_by_scenario_skips_empty_chunks():
+    locations = ["a.feature:2", "a.feature:5"]
+    chunks = make_chunks(locations, {}, 4, scenarios=True)
+    assert sorted(chunks) == [["a.feature:2"], ["a.feature:5"]]
+
+
+@pytest.fixture
+def suite(tmp_path, monkeypatch):
+    # -- No behave.ini: Workers must not depend on one.
+    steps = tmp_path / "features" / "steps"
+    steps.mkdir(parents=True)
+    (steps / "steps.py").write_text(STEPS)
+    (tmp_path / "features" / "environment.py").write_text(ENVIRONMENT)
+    (tmp_path / "features" / "a.feature").write_text(
+        u"Feature: A\n" + scenario(1) + scenario(2, u"@slow") +
+        u"  Scenario: broken\n    Then it fails\n")
+    (tmp_path / "features" / "b.feature").write_text(
+        u"Feature: B\n" + scenario(1) + scenario(2))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_threads_run_in_parallel_and_merge_in_file_order(suite, capsys):
+
+    returncode = parallel.main(["--jobs", "4", "--scenarios", "--threads",
+                                "--db", "missing.sqlite", "--json", "run.json",
+                                "features"])
+    output = capsys.readouterr().out
+
+    assert returncode == 1
+    assert "1 feature passed, 1 failed, 0 skipped" in output
+    assert "4 scenarios passed, 1 failed, 0 skipped" in output
+    assert "features/a.feature:7  broken" in output
+    took = float(output.rsplit("Took 0m", 1)[1].rstrip().rstrip("s"))
+    assert took < 0.7
+    data = json.load(open("run.json"))
+    assert [feature["name"] for feature in data] == ["A", "B"]
+    assert [element["name"] for element in data[0]["elements"]] == ["s1", "s2", "broken"]
+    assert len(os.listdir(os.path.join("reports", "parallel"))) == 8
+    # -- One API session per worker thread.
+    with open("sessions.txt") as f:
+        assert len(set(f.read().split())) == 4
+
+
+def test_processes_write_junit(suite, capsys):
+    returncode = parallel.main(["--jobs", "2", "--db", "missing.sqlite",
+                                "--junit", "junit", "features"])
+    output = capsys.readouterr().out
+
+    assert returncode == 1
+    assert "4 scenarios passed, 1 failed, 0 skipped" in output
+    assert sorted(os.listdir("junit")) == ["TESTS-a.xml", "TESTS-b.xml"]
+    suite_a = ElementTree.parse(os.path.join("junit", "TESTS-a.xml")).getroot()
+    assert (suite_a.get("tests"), suite_a.get("failures")) == ("3", "1")
+
+
+def test_crashed_workers_fail_the_run(suite, capsys):
+    (suite / "features" / "environment.py").write_text(u"raise ImportError('broken')\n")
+    returncode = parallel.main(["--jobs", "2", "--db", "missing.sqlite", "features"])
+    captured = capsys.readouterr()
+
+    assert returncode == 1
+    assert "0 features passed, 0 failed" in captured.out
+    assert "Workers failed without failing scenarios: 1, 2" in captured.err
@@ -0,0 +1,101 @@
+import io
+import time
+from types import SimpleNamespace
+
+from behave.configuration import Configuration
+from behave.formatter.base import StreamOpener
+
+import profiler
+from profiler import ProfileFormatter, compare, percentile, profile_hooks
+
+
+def make_formatter(tmp_path):
+    config = Configuration(command_args=[], load_config=False)
+    config.userdata["profile_output"] = str(tmp_path / "profile.json")
+    return ProfileFormatter(StreamOpener(stream=io.StringIO()), config)
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([3.0], 0.95) == 3.0
+    assert percentile([], 0.95) == 0.0
+
+
+def test_compare_lists_slower_steps_only():
+    baseline = {"steps": {"a.py:1": {"p95": 0.10}, "b.py:1": {"p95": 0.10},
+                          "c.py:1": {"p95": 0.001}}}
+    current = {"steps": {"a.py:1": {"p95": 0.13}, "b.py:1": {"p95": 0.11},
+                         "c.py:1": {"p95": 0.005}, "new.py:1": {"p95": 1.0}}}
+    assert compare(baseline, current) == [("a.py:1", 0.10, 0.13)]
+    assert compare(baseline, current, threshold=1.05) == [
+        ("a.py:1", 0.10, 0.13), ("b.py:1", 0.10, 0.11)]
+
+
+def test_step_body_is_timed_between_step_hooks(tmp_path):
+    namespace = {}
+    profile_hooks(namespace)
+    formatter = make_formatter(tmp_path)
+    step = SimpleNamespace(keyword="Given", name="a step", duration=5.0)
+
+    formatter.scenario(None)
+    formatter.match(SimpleNamespace(location="steps.py:3"))
+    namespace["before_step"](None, step)
+    time.sleep(0.01)
+    namespace["after_step"](None, step)
+    formatter.result(step)
+
+    body = formatter.steps["steps.py:3"]["durations"][0]
+    assert 0.01 <= body < 1.0
+    # -- Missing step hooks are added for timing but not reported.
+    assert formatter.hooks == {}
+    # -- The gap before the first step is capture, not matching.
+    assert formatter.matching == []
+    assert len(formatter.capture) == 2
+    formatter.close()
+
+
+def test_hook_timings_belong_to_the_running_formatter(tmp_path):
+    calls = []
+    namespace = {"before_scenario": lambda context, scenario: calls.append(1)}
+    profile_hooks(namespace)
+    first = make_formatter(tmp_path)
+    namespace["before_scenario"](None, None)
+    first.close()
+    assert profiler.active_profiler() is None
+
+    namespace["before_scenario"](None, None)
+    second = make_formatter(tmp_path)
+    namespace["before_scenario"](None, None)
+    assert len(first.hooks["before_scenario"]) == 1
+    assert len(second.hooks["before_scenario"]) == 1
+    assert calls == [1, 1, 1]
+    second.close()
+
+
+def test_step_matching_is_timed_in_the_registry(tmp_path):
+    class Registry(object):
+        def find_match(self, step):
+            time.sleep(0.01)
+            return "match:%s" % step
+
+    registry = Registry()
+    namespace = {}
+    profile_hooks(namespace)
+    formatter = make_formatter(tmp_path)
+    context = SimpleNamespace(_runner=SimpleNamespace(step_registry=registry))
+    namespace["before_all"](context)
+    namespace["before_all"](context)
+
+    formatter.scenario(None)
+    assert registry.find_match("one") == "match:one"
+    formatter.match(SimpleNamespace(location="steps.py:3"))
+
+    assert len(formatter.matching) == 1
+    assert formatter.matching[0] >= 0.01
+    # -- The matching time is not counted again as capture.
+    assert formatter.capture[0] < 0.01
+    formatter.close()
+    assert registry.find_match("two") == "match:two"